@@ -1,2 +1,8 @@
-from .estimate import estimate
-from .std import compare_std
\ No newline at end of file
+__version__ = "0.1.0"
+
+from .estimate import estimate, sweep
+from .std import compare_std, compare_variance_reduction
+from .profiling import EstimateResult, ProgressEvent, profile
+from .checkpoint import EstimateState, estimate_state, merge_states
+from .aio import estimate_async, compare_std_async
+from .cache import ResultCache
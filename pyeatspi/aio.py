@@ -0,0 +1,218 @@
+"""
+asyncio variants of estimate and compare_std, for use from an event loop.
+
+Both are async iterators of ProgressEvents, ending with a "result" event:
+
+    async for event in pyeatspi.estimate_async(10**9, "circle-ratio", seed=0):
+        print(event.done, event.value, event.se)
+
+The work runs in an executor (the loop's default thread pool if none is
+given), so the event loop stays responsive, and is split into chunks with
+control returning to the loop between them. Cancelling the consuming task,
+or closing the iterator, stops the run once the chunk in progress ends.
+estimate_async rejects the methods and options whose work cannot be split.
+"""
+import contextvars
+import functools
+import threading
+from .profiling import ProgressEvent
+
+# Number of samples drawn between two progress events of estimate_async
+PROGRESS_SAMPLES = 1_000_000
+
+# Methods which estimate_async runs in chunks. The others, whose work cannot
+# be stopped mid-run, are rejected.
+CHUNKED_METHODS = ["mc-integral", "circle-ratio", "buffon", "laplace", "drunkard"]
+
+# Arguments of estimate which run the whole estimate in one step, and are
+# not avaliable with estimate_async
+BLOCKING_ARGS = ("viz", "target_se", "detailed", "cache", "adaptive")
+
+# Arguments of estimate which are not options of the method, and do not
+# change the chunked estimate
+IGNORED_ARGS = ("backend", "max_samples")
+
+
+class _Stopped(Exception):
+    """Raised in the worker thread to stop a run whose consumer went away."""
+
+
+def _in_context(func, *args, **kwargs):
+    """Returns func bound to args, run in a copy of the caller's context (and its profiler)."""
+    return functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+async def estimate_async(sample_size, method, seed = None, executor = None,
+                         progress_every = PROGRESS_SAMPLES, **kwargs):
+    """
+    Estimate pi with a given method and sample size without blocking the
+    event loop, yielding a ProgressEvent every progress_every samples.
+
+    The 'mc-integral', 'circle-ratio', 'buffon' and 'laplace' samples are
+    drawn in vectorized chunks (split across threads with n_threads), and
+    every event holds the number of samples done, the partial estimate and
+    its standard error. The standard error is None for quasi-random and
+    stratified samples, whose scores are not independent. The 'drunkard'
+    walk advances progress_every steps of its chains per chunk, and its
+    standard error comes from online batch means like sweep.
+
+    The other methods, and viz, target_se, detailed, cache and adaptive, run
+    the whole estimate in one step which cannot be stopped, so they raise a
+    ValueError. Run estimate in an executor for those.
+
+    Args:
+        sample_size (int): The number of samples to use in the estimation.
+        method (str): The method to use in the estimation.
+        seed: The seed of the estimate.
+        executor (concurrent.futures.Executor): The executor to run the
+        chunks in. Defaults to the loop's default executor.
+        progress_every (int): The number of samples of a chunk.
+        **kwargs: The options of the method, and n_threads.
+
+    Yields:
+        ProgressEvent: The "progress" events, then a "result" event with the
+        final estimate.
+    """
+    import asyncio
+    from .estimate import load_method, methods
+
+    loop = asyncio.get_running_loop()
+    method_key = method.lower() if method else None
+    if method_key not in methods:
+        raise ValueError(f"Invalid method. Must be one of {list(methods.keys())}.")
+    if method_key not in CHUNKED_METHODS:
+        raise ValueError(f"estimate_async is only avaliable for {CHUNKED_METHODS}.")
+    for key in BLOCKING_ARGS:
+        if kwargs.get(key):
+            raise ValueError(f"{key} is not avaliable with estimate_async.")
+    if sample_size is None or sample_size < 1:
+        raise ValueError("sample_size must be a positive integer.")
+    if progress_every < 1:
+        raise ValueError("progress_every must be a positive integer.")
+
+    options = {key: value for key, value in kwargs.items() if key not in BLOCKING_ARGS + IGNORED_ARGS}
+    estimator = load_method(method_key)(sample_size=sample_size, viz=False, seed=seed, **options)
+    if method_key == "drunkard":
+        chunks = _walk_chunks(estimator, progress_every)
+    else:
+        chunks = _sample_chunks(estimator, progress_every)
+
+    done = 0
+    while done < sample_size:
+        done, value, se = await loop.run_in_executor(executor, _in_context(next, chunks))
+        kind = "progress" if done < sample_size else "result"
+        yield ProgressEvent(kind, method=method_key, done=done, total=sample_size, value=value, se=se)
+
+
+def _sample_chunks(estimator, progress_every):
+    """
+    Draws the samples of a SampledEstimator in chunks of progress_every,
+    yielding the number of samples done, the partial estimate and its
+    standard error after each. The running sum of the scores gives the same
+    estimate as a single run, and the RunningStats of independent scores
+    give its standard error.
+    """
+    from .qmc import thread_engines
+    from .sampling import RunningStats, split_sizes, standard_error, thread_rngs, threaded_sum
+
+    try:
+        estimator._check_independent("estimate_async")
+        stats = RunningStats()
+    except ValueError:
+        stats = None
+    quasi = estimator.sampler != "random"
+    if not quasi:
+        rngs = thread_rngs(estimator.seed, estimator.n_threads)
+
+    total = 0.0
+    done = 0
+    while done < estimator.sample_size:
+        n = min(progress_every, estimator.sample_size - done)
+        if quasi:
+            # The threads draw the next n points of the sequence, so the
+            # chunks cover the same points as a single run
+            rngs = thread_engines(estimator.sampler, estimator.seed, estimator.dim,
+                                  split_sizes(n, estimator.n_threads))
+            for engine in rngs:
+                engine.index += done
+        total += threaded_sum(estimator, rngs, n, stats=stats)
+        done += n
+
+        if total == 0 and done < estimator.sample_size:
+            # No estimate yet, e.g. no needle crossed a line
+            yield done, None, None
+            continue
+        se = standard_error(estimator, stats) if stats is not None else None
+        yield done, estimator._pi_from_mean(total / done), se
+
+
+def _walk_chunks(estimator, progress_every):
+    """
+    Advances the chains of a Drunkard by progress_every steps at a time,
+    yielding the number of steps done (including burn in), the partial
+    estimate and its batch means standard error after each.
+    """
+    from itertools import islice
+    from .sampling import BatchMeans
+
+    n_post = estimator.sample_size - estimator.burn_in
+    if n_post < 1:
+        raise ValueError("burn_in must be less than sample_size.")
+    steps = estimator._steps()
+    stats = BatchMeans()
+    while stats.count < n_post:
+        for value in islice(steps, min(progress_every, n_post - stats.count)):
+            stats.add(value)
+        result = estimator._batch_estimate(stats)
+        yield estimator.burn_in + stats.count, result.estimate, result.se
+
+
+async def compare_std_async(sample_size, simulation_size, executor = None, **kwargs):
+    """
+    Compare the standard deviation of the methods like compare_std, without
+    blocking the event loop. compare_std runs in a thread of the executor,
+    and its progress is streamed as the ProgressEvents of its callback.
+    Stopping the iteration stops the simulations after the block in
+    progress.
+
+    Args:
+        sample_size (int): The number of samples to use in the each estimation.
+        simulation_size (int): The number of simulations to run for each method.
+        executor (concurrent.futures.Executor): The executor to run
+        compare_std in. Defaults to the loop's default executor.
+        **kwargs: The other arguments of compare_std, e.g. n_jobs to run the
+        simulations themselves in worker processes.
+
+    Yields:
+        ProgressEvent: The "warning", "start" and "progress" events, then a
+        "result" event with the standard deviation of each method.
+    """
+    import asyncio
+    from .std import compare_std
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    stopped = threading.Event()
+
+    def callback(event):
+        # Called in the worker thread
+        if stopped.is_set():
+            raise _Stopped()
+        loop.call_soon_threadsafe(queue.put_nowait, event)
+
+    future = loop.run_in_executor(executor, _in_context(compare_std, sample_size, simulation_size,
+                                                        callback=callback, **kwargs))
+    # Wake the iterator up once compare_std returns or raises
+    future.add_done_callback(lambda _: queue.put_nowait(None))
+    try:
+        while True:
+            event = await queue.get()
+            if event is None:
+                future.result()
+                return
+            yield event
+    finally:
+        if not future.done():
+            stopped.set()
+            # The run ends with _Stopped, which nobody waits for
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
@@ -0,0 +1,335 @@
+"""
+Benchmark suite for the pi estimation methods.
+
+    python -m pyeatspi.benchmark [--quick] [--output FILE] [--convergence]
+                                 [--scaling DIGITS]
+                                 [--compare BASELINE] [--threshold FRACTION]
+
+Every method is run across a range of sample sizes, recording the wall time,
+the throughput (samples/sec, or digits/sec for Chudnovsky) and the peak
+memory of each run, and the wall time of a run of the sample size needed
+for a given root mean squared error against math.pi. The results are emitted as JSON, so that runs from
+different commits can be compared: with --compare, the run fails (exit code
+1) if a throughput dropped by more than the threshold against the baseline.
+
+With --convergence, the random and quasi-random samplers are also compared
+by the number of samples they need per correct digit. With --scaling, the
+parallel binary splitting of Chudnovsky is timed with 1, 2, 4, ... worker
+processes up to the number of CPUs, and its scaling efficiency reported.
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+from .estimate import estimate, load_method, qmc_methods
+
+# Absolute error against math.pi for the time to precision
+TOLERANCE = 1e-3
+
+# Number of seeded runs whose error is measured for the time to precision
+PRECISION_REPLICATES = 8
+
+# Number of timed runs of each case and size, of which the fastest is kept
+REPEAT = 3
+
+# Relative throughput drop reported as a regression
+REGRESSION_THRESHOLD = 0.2
+
+# Runs faster than this in the baseline, in seconds, are too noisy to compare
+MIN_COMPARE_TIME = 0.01
+
+# Benchmark cases, as the arguments passed to pyeatspi.estimate. The random
+# methods are seeded so that runs are comparable.
+CASES = {
+    "mc-integral": {"method": "mc-integral", "seed": 0},
+    "mc-integral[numpy]": {"method": "mc-integral", "backend": "numpy", "seed": 0},
+    "circle-ratio": {"method": "circle-ratio", "seed": 0},
+    "circle-ratio[numpy]": {"method": "circle-ratio", "backend": "numpy", "seed": 0},
+    "buffon": {"method": "buffon", "seed": 0},
+    "buffon[numpy]": {"method": "buffon", "backend": "numpy", "seed": 0},
+    "buffon[vector]": {"method": "buffon", "backend": "numpy", "kernel": "vector", "seed": 0},
+    "buffon[vector,float32]": {"method": "buffon", "backend": "numpy", "kernel": "vector",
+                               "dtype": "float32", "seed": 0},
+    "laplace": {"method": "laplace", "seed": 0},
+    "laplace[numpy]": {"method": "laplace", "backend": "numpy", "seed": 0},
+    "laplace[vector]": {"method": "laplace", "backend": "numpy", "kernel": "vector", "seed": 0},
+    "laplace[vector,float32]": {"method": "laplace", "backend": "numpy", "kernel": "vector",
+                                "dtype": "float32", "seed": 0},
+    "drunkard": {"method": "drunkard", "seed": 0},
+    "newtons": {"method": "newtons", "tolerance": 1e-12},
+    "chudnovsky": {"method": "chudnovsky"},
+}
+
+# Sample sizes of the cases, and the largest sample size tried when looking
+# for the time to precision. For Chudnovsky, the sizes are digits.
+SIZES = {"python": [10**3, 10**4, 10**5],
+         "numpy": [10**4, 10**5, 10**6, 10**7],
+         "newtons": [10, 100],
+         "chudnovsky": [10**3, 10**4, 10**5]}
+QUICK_SIZES = {"python": [10**3, 10**4],
+               "numpy": [10**4, 10**5],
+               "newtons": [10],
+               "chudnovsky": [10**3, 10**4]}
+MAX_SAMPLES = {"python": 10**6, "numpy": 10**8, "newtons": 100}
+
+# Sample sizes and number of replicates of the sampler convergence comparison
+CONVERGENCE_SIZES = [2**k for k in range(6, 21, 2)]
+QUICK_CONVERGENCE_SIZES = [2**k for k in range(6, 15, 2)]
+CONVERGENCE_REPLICATES = 32
+
+
+def _kind(case):
+    """The size grid a case uses."""
+    if case["method"] in ("newtons", "chudnovsky"):
+        return case["method"]
+    return case.get("backend", "python")
+
+
+def _run(case, sample_size):
+    """Runs one estimate quietly, returning the estimate as a float."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = estimate(sample_size, **case)
+    return float(getattr(result, "estimate", result))
+
+
+def measure(case, sample_size, repeat = REPEAT):
+    """
+    Times the best of repeat runs of a case, and runs it once more under
+    tracemalloc for the peak memory, as tracing slows the run down.
+
+    Returns:
+        dict: The wall time, throughput, peak memory and absolute error.
+    """
+    wall_time = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = _run(case, sample_size)
+        wall_time = min(wall_time, time.perf_counter() - start)
+
+    tracemalloc.start()
+    _run(case, sample_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rate = "digits_per_sec" if case["method"] == "chudnovsky" else "samples_per_sec"
+    return {"sample_size": sample_size,
+            "wall_time": wall_time,
+            rate: sample_size / wall_time,
+            "peak_memory_bytes": peak,
+            "abs_error": abs(value - math.pi)}
+
+
+def time_to_precision(case, tolerance = TOLERANCE, replicates = PRECISION_REPLICATES):
+    """
+    Doubles the sample size until the root mean squared error against
+    math.pi of replicates runs, seeded 0, 1, ..., is below tolerance, or
+    MAX_SAMPLES is reached. A single run can land within tolerance by
+    chance, so the error is measured over the replicates, like in
+    convergence. Cases without a seed are deterministic, and run once.
+
+    Returns:
+        dict: The mean wall time of one run at the sample size reached, that
+        sample size, its error, and whether the tolerance was reached.
+    """
+    max_samples = MAX_SAMPLES[_kind(case)]
+    sample_size = 10 if case["method"] == "newtons" else 1000
+    seeds = range(replicates) if "seed" in case else [None]
+    while True:
+        wall_time = 0.0
+        squares = 0.0
+        for seed in seeds:
+            replicate = case if seed is None else dict(case, seed=seed)
+            start = time.perf_counter()
+            value = _run(replicate, sample_size)
+            wall_time += time.perf_counter() - start
+            squares += (value - math.pi)**2
+        rmse = math.sqrt(squares / len(seeds))
+        reached = rmse < tolerance
+        if reached or sample_size >= max_samples:
+            break
+        sample_size = min(2 * sample_size, max_samples)
+    return {"wall_time": wall_time / len(seeds), "sample_size": sample_size, "rmse": rmse,
+            "reached": reached}
+
+
+def convergence(method, sizes = CONVERGENCE_SIZES, replicates = CONVERGENCE_REPLICATES):
+    """
+    Compares the samplers of a method by the root mean squared error of
+    replicates estimates at each sample size. The quasi-random replicates
+    are independently scrambled, so the errors of all samplers are measured
+    the same way.
+
+    Returns:
+        dict: For each sampler, the error at each sample size, and the
+        smallest sample size whose error is below 10**-d for each number of
+        digits d reached.
+    """
+    from .qmc import SAMPLERS
+    import numpy as np
+
+    results = {}
+    for sampler in SAMPLERS:
+        rmse = {}
+        for n in sizes:
+            estimator = load_method(method)(sample_size=n, viz=False, seed=0, sampler=sampler)
+            rmse[n] = float(np.sqrt(np.mean((estimator.estimate_many(replicates) - math.pi)**2)))
+        samples_per_digit = {}
+        for n, error in rmse.items():
+            digits = int(-math.log10(error)) if error > 0 else 16
+            for d in range(1, digits + 1):
+                samples_per_digit.setdefault(d, n)
+        results[sampler] = {"rmse": rmse, "samples_per_digit": samples_per_digit}
+    return results
+
+
+def scaling(digits, max_jobs = None):
+    """
+    Times the Chudnovsky method to digits decimal places with n_jobs of 1, 2,
+    4, ... up to max_jobs (by default the number of CPUs).
+
+    Returns:
+        list: For each n_jobs, the wall time, the speedup over one process and
+        the scaling efficiency (speedup / n_jobs).
+    """
+    max_jobs = max_jobs or os.cpu_count()
+    jobs = [2**k for k in range(max_jobs.bit_length()) if 2**k < max_jobs] + [max_jobs]
+    results = []
+    for n_jobs in jobs:
+        start = time.perf_counter()
+        _run({"method": "chudnovsky", "n_jobs": n_jobs}, digits)
+        wall_time = time.perf_counter() - start
+        speedup = results[0]["wall_time"] / wall_time if results else 1.0
+        results.append({"n_jobs": n_jobs, "wall_time": wall_time,
+                        "speedup": speedup, "efficiency": speedup / n_jobs})
+    return results
+
+
+def run(quick = False, tolerance = TOLERANCE, cases = None, repeat = REPEAT, samplers = False,
+        scaling_digits = None):
+    """
+    Runs the benchmark cases.
+
+    Args:
+        quick (bool): Use a smaller grid of sample sizes.
+        tolerance (float): The root mean squared error for the time to precision.
+        cases (list): The names of the cases to run. If None, all cases.
+        repeat (int): The number of timed runs of each case and size.
+        samplers (bool): Whether to also compare the convergence of the
+        random and quasi-random samplers.
+        scaling_digits (int): If given, report the scaling of the parallel
+        Chudnovsky method at this number of digits.
+
+    Returns:
+        dict: The results, ready to be serialized as JSON.
+    """
+    sizes = QUICK_SIZES if quick else SIZES
+    results = {"meta": {"python": platform.python_version(),
+                        "platform": platform.platform(),
+                        "tolerance": tolerance,
+                        "quick": quick},
+               "cases": {}}
+
+    for name in cases or CASES:
+        case = CASES[name]
+        print(f"Benchmarking {name}...", file=sys.stderr)
+        # Warm up, so the first size does not pay for imports
+        _run(case, sizes[_kind(case)][0])
+        result = {"sizes": [measure(case, n, repeat) for n in sizes[_kind(case)]]}
+        if case["method"] != "chudnovsky":
+            result["time_to_precision"] = time_to_precision(case, tolerance)
+        results["cases"][name] = result
+
+    if samplers:
+        results["convergence"] = {}
+        for method in qmc_methods:
+            print(f"Comparing the samplers of {method}...", file=sys.stderr)
+            sizes = QUICK_CONVERGENCE_SIZES if quick else CONVERGENCE_SIZES
+            results["convergence"][method] = convergence(method, sizes)
+
+    if scaling_digits:
+        print(f"Scaling chudnovsky to {scaling_digits} digits...", file=sys.stderr)
+        results["scaling"] = scaling(scaling_digits)
+
+    return results
+
+
+def compare(results, baseline, threshold = REGRESSION_THRESHOLD):
+    """
+    Compares the throughput of each case and size against a baseline run.
+    Runs which took less than MIN_COMPARE_TIME in the baseline are skipped.
+
+    Returns:
+        list: A description of every regression larger than threshold.
+    """
+    regressions = []
+    for name, result in results["cases"].items():
+        if name not in baseline["cases"]:
+            continue
+        old_sizes = {r["sample_size"]: r for r in baseline["cases"][name]["sizes"]}
+        for new in result["sizes"]:
+            old = old_sizes.get(new["sample_size"])
+            if old is None or old["wall_time"] < MIN_COMPARE_TIME:
+                continue
+            rate = "digits_per_sec" if "digits_per_sec" in new else "samples_per_sec"
+            change = new[rate] / old[rate] - 1
+            if change < -threshold:
+                regressions.append(f"{name} at {new['sample_size']}: {rate} "
+                                   f"{old[rate]:.4g} -> {new[rate]:.4g} ({change:+.0%})")
+    return regressions
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="Use a smaller grid of sample sizes.")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), help="The cases to run.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--convergence", action="store_true",
+                        help="Compare the samples per digit of the random and quasi-random samplers.")
+    parser.add_argument("--scaling", type=int, metavar="DIGITS",
+                        help="Report the scaling of the parallel Chudnovsky method at DIGITS digits.")
+    parser.add_argument("--output", help="Write the results to this JSON file instead of stdout.")
+    parser.add_argument("--compare", help="A baseline JSON file to check for regressions against.")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    results = run(args.quick, args.tolerance, args.cases, args.repeat, args.convergence, args.scaling)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    for method, samplers in results.get("convergence", {}).items():
+        print(f"\nSamples needed per digit for {method}:", file=sys.stderr)
+        for sampler, result in samplers.items():
+            needed = ", ".join(f"{d}: {n}" for d, n in result["samples_per_digit"].items())
+            print(f"{sampler:<8} {needed}", file=sys.stderr)
+
+    if "scaling" in results:
+        print("\nScaling of the parallel Chudnovsky method:", file=sys.stderr)
+        for result in results["scaling"]:
+            print(f"n_jobs={result['n_jobs']:<4} {result['wall_time']:8.2f} s   "
+                  f"speedup {result['speedup']:5.2f}   efficiency {result['efficiency']:.0%}",
+                  file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for regression in regressions:
+            print("REGRESSION", regression, file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
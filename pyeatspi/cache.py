@@ -0,0 +1,262 @@
+"""
+Opt-in cache of the results of estimate and compare_std.
+
+With a seed, estimates are deterministic, so repeated identical calls can
+be served from a ResultCache instead of being run again:
+
+    cache = pyeatspi.ResultCache("~/.cache/pyeatspi/results")
+    stds = pyeatspi.compare_std(10000, 1000, seed=42, cache=cache)
+    print(cache.stats())
+
+The cache has two levels: an in-memory LRU of max_entries results, and
+optionally a directory on disk holding one pickle file per result, evicted
+least recently used first once it holds more than max_bytes. Disk entries
+are replaced atomically and evicted under an fcntl lock, so the directory
+can be shared by several processes. It holds pickles, so only share it
+between trusted users.
+
+Results are keyed on the name of the call, all its arguments (including
+every option of the method and the seed) and the version of pyeatspi.
+Calls without a seed are not cached, except for the deterministic methods.
+"""
+import contextlib
+import copy
+import os
+import threading
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows, where evictions are not serialized
+    fcntl = None
+
+# Default number of results held in memory
+MAX_ENTRIES = 256
+
+# Default size of the disk level, in bytes
+MAX_BYTES = 100 * 2**20
+
+ENTRY_SUFFIX = ".pkl"
+LOCK_FILE = "cache.lock"
+
+_default_cache = None
+
+
+class ResultCache:
+    """
+    A two-level (memory and disk) cache of results.
+
+    Args:
+        path (str): The directory of the disk level, created if needed. If
+        None, results are only cached in memory.
+        max_entries (int): The number of results held in memory.
+        max_bytes (int): The size of the disk level.
+    """
+
+    def __init__(self, path = None, max_entries = MAX_ENTRIES, max_bytes = MAX_BYTES):
+        self.path = os.path.expanduser(path) if path is not None else None
+        if self.path is not None:
+            os.makedirs(self.path, exist_ok=True)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    def stats(self):
+        """Returns the hit and miss counters of this process, and the size of each level."""
+        return {"hits": self.hits, "memory_hits": self.memory_hits, "disk_hits": self.disk_hits,
+                "misses": self.misses, "memory_entries": len(self.memory),
+                "disk_bytes": sum(size for _, _, size in self._disk_entries())}
+
+    def call(self, name, params, func, requires_seed = True):
+        """
+        Returns func(), or the result cached for the same name and params.
+
+        Args:
+            name (str): The name of the call.
+            params (dict): All the arguments of the call, including "seed".
+            func (callable): Computes the result.
+            requires_seed (bool): Whether the result is only deterministic
+            with a seed. If so, calls without a seed (or with a random
+            generator as seed) bypass the cache.
+        """
+        if requires_seed and _canonical_seed(params.get("seed")) is None:
+            return func()
+        key = self.key(name, params)
+        hit, value = self.get(key)
+        if hit:
+            return value
+        value = func()
+        self.put(key, value)
+        return value
+
+    def key(self, name, params):
+        """Returns the key of a call, a hash of its name, params and the version of pyeatspi."""
+        import hashlib
+        import json
+        from . import __version__
+
+        params = dict(params)
+        params["seed"] = _canonical_seed(params.get("seed"))
+        text = json.dumps([__version__, name, _canonical(params)], sort_keys=True)
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key):
+        """Returns (True, result) if key is cached, or (False, None)."""
+        with self._lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                # A copy, so callers modifying a result do not change the cache
+                return True, copy.deepcopy(self.memory[key])
+
+        hit, value = self._read(key)
+        with self._lock:
+            if not hit:
+                self.misses += 1
+                return False, None
+            self.disk_hits += 1
+        self._remember(key, copy.deepcopy(value))
+        return True, value
+
+    def put(self, key, value):
+        """Caches the result of key in memory, and on disk."""
+        self._remember(key, copy.deepcopy(value))
+        if self.path is not None:
+            import pickle
+            from .digitstore import replace_file
+
+            replace_file(self._file(key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+            self._evict()
+
+    def clear(self):
+        """Removes every result from both levels."""
+        with self._lock:
+            self.memory.clear()
+        with self._locked():
+            for path, _, _ in self._disk_entries():
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+
+    def _remember(self, key, value):
+        with self._lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+
+    def _file(self, key):
+        return os.path.join(self.path, key + ENTRY_SUFFIX)
+
+    def _read(self, key):
+        """Returns (True, result) if key is cached on disk, or (False, None)."""
+        import pickle
+
+        if self.path is None:
+            return False, None
+        try:
+            with open(self._file(key), "rb") as f:
+                value = pickle.load(f)
+            # Mark the entry as recently used, for the eviction
+            os.utime(self._file(key))
+        except FileNotFoundError:
+            return False, None
+        except (pickle.UnpicklingError, AttributeError, EOFError, ImportError):
+            # Written by an incompatible version
+            return False, None
+        return True, value
+
+    def _disk_entries(self):
+        """Returns the (path, last use, size) of the results on disk."""
+        if self.path is None:
+            return []
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                with contextlib.suppress(FileNotFoundError):
+                    stat = entry.stat()
+                    entries.append((entry.path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def _evict(self):
+        """Removes the least recently used results on disk until it fits in max_bytes."""
+        with self._locked():
+            entries = sorted(self._disk_entries(), key=lambda entry: entry[1])
+            total = sum(size for _, _, size in entries)
+            for path, _, size in entries:
+                if total <= self.max_bytes:
+                    break
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(path)
+                total -= size
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Holds the exclusive lock of the disk level, shared by all processes."""
+        if self.path is None:
+            yield
+            return
+        with open(os.path.join(self.path, LOCK_FILE), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def get_cache(cache):
+    """Returns cache, or the in-memory cache shared by the process if cache is True."""
+    global _default_cache
+    if cache is True:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
+    if not isinstance(cache, ResultCache):
+        raise ValueError("cache must be a ResultCache, or True for the default in-memory cache.")
+    return cache
+
+
+def _canonical_seed(seed):
+    """Returns a JSON representation of a seed which fully determines its stream, or None."""
+    if isinstance(seed, bool):
+        return None
+    if isinstance(seed, int):
+        return seed
+    if isinstance(seed, (list, tuple)) and seed and all(isinstance(s, int) for s in seed):
+        return list(seed)
+    if type(seed).__name__ == "SeedSequence":
+        # The children spawned so far change those spawned next
+        return {"entropy": _canonical(seed.entropy), "spawn_key": list(seed.spawn_key),
+                "pool_size": seed.pool_size, "spawned": seed.n_children_spawned}
+    return None
+
+
+def _canonical(value):
+    """Returns a JSON representation of an argument."""
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if hasattr(value, "tobytes") and hasattr(value, "dtype"):
+        import hashlib
+
+        # numpy arrays and scalars, e.g. the starts of Newton's method
+        return {"dtype": str(value.dtype), "shape": list(getattr(value, "shape", ())),
+                "sha256": hashlib.sha256(value.tobytes()).hexdigest()}
+    from .digitstore import DigitStore
+
+    if isinstance(value, DigitStore):
+        # Stores of the same directory hold the same digits
+        return {"DigitStore": os.path.realpath(value.path)}
+    return repr(value)
@@ -0,0 +1,194 @@
+"""
+Checkpointable and mergeable state of long Monte Carlo runs.
+
+An EstimateState holds the sufficient statistics of the per-sample scores
+drawn so far (their count, mean and sum of squared deviations) and the
+position of the random generator they were drawn from:
+
+    state = pyeatspi.estimate_state(10**11, "circle-ratio", seed=0,
+                                    checkpoint="run.json")
+    print(state.result())
+
+The state is saved to the checkpoint file every checkpoint_every samples,
+and a killed run started again with the same checkpoint resumes from the
+last save, drawing exactly the samples it would have drawn without the
+interruption. Shards run with different seeds, e.g. seed=(0, shard), can be
+combined offline with merge_states into one estimate, whose standard error
+accounts for all the samples.
+"""
+import os
+from .profiling import phase
+
+# Number of samples drawn between two checkpoints
+CHECKPOINT_SAMPLES = 10**8
+
+# Options which do not change the scores, and are not part of a state
+RUN_OPTIONS = ("backend",)
+
+
+class EstimateState:
+    """
+    The statistics of the scores of an estimate, and the state of its
+    random generator.
+
+    Args:
+        method (str): The method the scores were drawn with.
+        options (dict): The keyword arguments of the method, which must be
+        JSON serializable.
+    """
+
+    def __init__(self, method, options = None):
+        from .sampling import RunningStats
+
+        self.method = method
+        self.options = dict(options or {})
+        self.stats = RunningStats()
+        # The bit_generator.state of the numpy Generator, or None for a
+        # merged state, which cannot be resumed
+        self.rng_state = None
+
+    @property
+    def samples(self):
+        """The number of samples drawn."""
+        return self.stats.count
+
+    def result(self):
+        """
+        Returns:
+            SequentialEstimate: The estimate of pi, its standard error from
+            the delta method, and the number of samples.
+        """
+        from .estimate import load_method
+        from .sampling import SequentialEstimate, standard_error
+
+        if self.samples == 0:
+            raise ValueError("The state holds no samples.")
+        estimator = load_method(self.method)(sample_size=self.samples, viz=False, **self.options)
+        estimate = estimator._pi_from_mean(self.stats.mean)
+        return SequentialEstimate(estimate, standard_error(estimator, self.stats), self.samples)
+
+    def merge(self, other):
+        """
+        Returns a new state holding the samples of both states. Merging is
+        associative and commutative, up to rounding. The merged state has no
+        generator position, so it can be saved but not resumed.
+        """
+        if (self.method, self.options) != (other.method, other.options):
+            raise ValueError("Only states of the same method and options can be merged.")
+        merged = EstimateState(self.method, self.options)
+        merged.stats.merge(self.stats)
+        merged.stats.merge(other.stats)
+        return merged
+
+    def to_dict(self):
+        return {"method": self.method, "options": self.options,
+                "count": self.stats.count, "mean": self.stats.mean, "m2": self.stats.m2,
+                "rng_state": self.rng_state}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(data["method"], data["options"])
+        state.stats.count = data["count"]
+        state.stats.mean = data["mean"]
+        state.stats.m2 = data["m2"]
+        state.rng_state = data["rng_state"]
+        return state
+
+    def save(self, path):
+        """Saves the state as JSON to path, atomically replacing the file."""
+        import json
+        from .digitstore import replace_file
+
+        replace_file(os.path.expanduser(path), json.dumps(self.to_dict()).encode())
+
+    @classmethod
+    def load(cls, path):
+        """Loads a state saved with save."""
+        import json
+
+        with open(os.path.expanduser(path)) as f:
+            return cls.from_dict(json.load(f))
+
+
+def estimate_state(sample_size, method, seed = None, checkpoint = None,
+                   checkpoint_every = CHECKPOINT_SAMPLES, state = None, **kwargs):
+    """
+    Draws samples of a method until its state holds sample_size samples.
+
+    Args:
+        sample_size (int): The total number of samples of the state.
+        method (str): One of the methods supporting target_se.
+        seed: The seed of the random generator of a new state.
+        checkpoint (str): A file to save the state to every checkpoint_every
+        samples. If it exists, the run resumes from the state it holds.
+        checkpoint_every (int): The number of samples between two saves.
+        state (EstimateState): A state to resume, instead of the checkpoint.
+        **kwargs: The options of the method.
+
+    Returns:
+        EstimateState: The state after sample_size samples.
+    """
+    from .estimate import load_method, methods, sequential_methods
+
+    method_key = method.lower() if method else None
+    if method_key not in methods:
+        raise ValueError(f"Invalid method. Must be one of {list(methods.keys())}.")
+    if method_key not in sequential_methods:
+        raise ValueError(f"estimate_state is only avaliable for {sequential_methods}.")
+    if kwargs.get("n_threads", 1) != 1:
+        raise ValueError("n_threads is not avaliable with estimate_state. Run shards with " +
+                         "different seeds instead, and merge their states.")
+    options = {key: value for key, value in kwargs.items() if key not in RUN_OPTIONS}
+
+    if state is None and checkpoint is not None and os.path.exists(os.path.expanduser(checkpoint)):
+        state = EstimateState.load(checkpoint)
+    if state is None:
+        state = EstimateState(method_key, options)
+    elif (state.method, state.options) != (method_key, options):
+        raise ValueError("The state was drawn with another method or other options.")
+
+    estimator = load_method(method_key)(sample_size=sample_size, viz=False, seed=seed, **kwargs)
+    return estimator.estimate_state(state, checkpoint, checkpoint_every)
+
+
+def merge_states(states):
+    """Returns the merge of an iterable of states, e.g. of the shards of a run."""
+    merged = None
+    for state in states:
+        merged = state if merged is None else merged.merge(state)
+    if merged is None:
+        raise ValueError("No states to merge.")
+    return merged
+
+
+def accumulate(estimator, state, checkpoint = None, checkpoint_every = CHECKPOINT_SAMPLES):
+    """
+    Draws the scores of an estimator into state until it holds the
+    estimator's sample_size samples, resuming its generator from the saved
+    position, and saving it to checkpoint every checkpoint_every samples.
+    The estimator must implement the _draw and _score hooks.
+
+    Returns:
+        EstimateState: state, updated in place.
+    """
+    from .sampling import _scores, chunk_sizes, make_rng
+
+    remaining = estimator.sample_size - state.samples
+    if remaining <= 0:
+        return state
+    if state.rng_state is None and state.samples > 0:
+        raise ValueError("A merged state cannot be resumed.")
+
+    rng = make_rng(estimator.seed)
+    if state.rng_state is not None:
+        rng.bit_generator.state = state.rng_state
+
+    for n in chunk_sizes(remaining, checkpoint_every):
+        for size in chunk_sizes(n):
+            scores = _scores(estimator, rng, size)
+            with phase("reduce"):
+                state.stats.update(scores)
+        state.rng_state = rng.bit_generator.state
+        if checkpoint is not None:
+            state.save(checkpoint)
+    return state
@@ -0,0 +1,159 @@
+"""
+Persistent on-disk store of the digits of pi computed by the Chudnovsky method.
+
+The store is a directory holding two files:
+
+    pi.digits  The most precise result so far, as a flat ASCII file of
+               digits ("31415926..."). Smaller requests are answered by
+               slicing a memory-mapped view of it.
+    pi.state   The binary splitting integers (n_terms, P, Q, T) of the
+               series summed so far, so that larger requests resume the
+               series instead of starting over.
+
+Both files are only ever replaced atomically with os.replace, so readers
+never see a partial file and need no locking. Writers extending the store
+serialize on an fcntl lock, where fcntl is available.
+"""
+import contextlib
+import mmap
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows, where writers are not serialized
+    fcntl = None
+
+DIGITS_FILE = "pi.digits"
+STATE_FILE = "pi.state"
+LOCK_FILE = "pi.lock"
+
+# Bytes of the length prefix of each integer in the state file
+LENGTH_BYTES = 8
+
+
+class DigitStore:
+    """
+    A directory of precomputed digits of pi, shared between processes.
+
+    Args:
+        path (str): The directory of the store. It is created if needed.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        os.makedirs(self.path, exist_ok=True)
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def digits(self):
+        """Returns the number of decimal places stored."""
+        return max(0, self._size() - 1)
+
+    def _size(self):
+        """Returns the number of stored digits, including the 3."""
+        try:
+            return os.path.getsize(self._file(DIGITS_FILE))
+        except FileNotFoundError:
+            return 0
+
+    def read(self, digits):
+        """
+        Returns pi to digits decimal places as a string of digits without the
+        decimal point ("31415..."), or None if fewer digits are stored.
+        """
+        return self.slice(0, digits + 1)
+
+    def slice(self, start, count):
+        """
+        Returns the count stored digits from position start of "31415...",
+        where position i > 0 is the i-th decimal place, or None if they are
+        not all stored. Only the requested part of the file is read.
+        """
+        try:
+            with open(self._file(DIGITS_FILE), "rb") as f:
+                if os.fstat(f.fileno()).st_size < start + count:
+                    return None
+                if count == 0:
+                    return ""
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    return view[start:start + count].decode("ascii")
+        except FileNotFoundError:
+            return None
+
+    def write(self, text):
+        """Replaces the stored digits with text, if it holds more digits."""
+        if len(text) > self._size():
+            self._replace(DIGITS_FILE, text.encode("ascii"))
+
+    def load_state(self):
+        """Returns the saved binary splitting state (n_terms, P, Q, T), or None."""
+        try:
+            with open(self._file(STATE_FILE), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        state = []
+        pos = 0
+        while pos < len(data):
+            length = int.from_bytes(data[pos:pos + LENGTH_BYTES], "little")
+            pos += LENGTH_BYTES
+            state.append(int.from_bytes(data[pos:pos + length], "little", signed=True))
+            pos += length
+        return tuple(state)
+
+    def save_state(self, state):
+        """Saves the binary splitting state (n_terms, P, Q, T) of the series."""
+        if self._saved_terms() >= state[0]:
+            return
+        parts = []
+        for x in state:
+            data = x.to_bytes(x.bit_length() // 8 + 1, "little", signed=True)
+            parts += [len(data).to_bytes(LENGTH_BYTES, "little"), data]
+        self._replace(STATE_FILE, b"".join(parts))
+
+    def _saved_terms(self):
+        """Returns the number of terms of the saved state, reading only its first integer."""
+        try:
+            with open(self._file(STATE_FILE), "rb") as f:
+                length = int.from_bytes(f.read(LENGTH_BYTES), "little")
+                return int.from_bytes(f.read(length), "little", signed=True)
+        except FileNotFoundError:
+            return 0
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Holds the exclusive writer lock of the store."""
+        with open(self._file(LOCK_FILE), "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _replace(self, name, data):
+        """Atomically replaces the file name of the store with data."""
+        replace_file(self._file(name), data)
+
+
+def replace_file(path, data):
+    """
+    Writes data to a temporary file next to path, then atomically moves it
+    to path, so that readers see either the old or the new file.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".",
+                               prefix=os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # mkstemp files are private, but the store is shared
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -1,12 +1,49 @@
-from .methods.buffonsneedle import BuffonsNeedle
-from .methods.circleratio import CircleRatio
-from .methods.laplaceneedle import LaplaceNeedle
-from .methods.mcintegral import MCIntegral
-from .methods.drunkard import Drunkard
-from .methods.chudnovsky import Chudnovsky
-from .methods.newtons import Newtons
-
-def estimate(sample_size: int, method: str, viz = False, **kwargs):
+import importlib
+import os
+import time
+from .profiling import make_result
+
+# Registry of the avaliable methods, as (module, class) names. The method
+# modules are only imported when a method is first used, so that importing
+# pyeatspi does not pull in numpy or matplotlib.
+methods = {"mc-integral": ("mcintegral", "MCIntegral"),
+           "circle-ratio": ("circleratio", "CircleRatio"),
+           "drunkard": ("drunkard", "Drunkard"),
+           "buffon": ("buffonsneedle", "BuffonsNeedle"),
+           "laplace": ("laplaceneedle", "LaplaceNeedle"),
+           "chudnovsky": ("chudnovsky", "Chudnovsky"),
+           "newtons": ("newtons", "Newtons")}
+
+# Methods which support the vectorized numpy backend
+numpy_methods = ["mc-integral", "circle-ratio", "buffon", "laplace"]
+
+# Methods which support the quasi-random (Sobol and Halton) samplers
+qmc_methods = ["mc-integral", "circle-ratio"]
+
+# Methods which can split the samples of an estimate across threads
+threaded_methods = numpy_methods
+
+# Methods which support sequential estimation to a target standard error
+sequential_methods = ["mc-integral", "circle-ratio", "buffon", "laplace"]
+
+# Methods which support sweeping the estimate over increasing sample sizes
+sweep_methods = ["mc-integral", "circle-ratio", "buffon", "laplace", "drunkard"]
+
+# Methods whose result does not depend on a seed, and which are cached
+# without one
+deterministic_methods = ["chudnovsky", "newtons"]
+
+# Sample budget of a sequential estimate when no sample size is given
+DEFAULT_MAX_SAMPLES = 10**9
+
+def load_method(method):
+    """Returns the estimator class of a method, importing its module on first use."""
+    module, name = methods[method]
+    return getattr(importlib.import_module(f".methods.{module}", __package__), name)
+
+def estimate(sample_size: int = None, method: str = None, viz = False, backend = "python",
+             target_se: float = None, max_samples: int = None, sampler: str = "random",
+             detailed: bool = False, n_threads: int = 1, cache = None, **kwargs):
     """
     Estimate pi using a given method and sample size, with optional visualization.
     Visualization is not supported by all methods. Detailed descriptions of each
@@ -16,7 +53,48 @@ def estimate(sample_size: int, method: str, viz = False, **kwargs):
         samples (int): The number of samples to use in the estimation.
         method (str): The method to use in the estimation.
         viz (bool): Whether to visualize the estimation process. Not avaliable
-        for laplace or avg-value methods.
+        for laplace or avg-value methods. For 'circle-ratio', 'drunkard' and
+        'buffon', viz="raster" renders density rasters built as the samples
+        stream in, with a random subsample on top, in bounded memory.
+        backend (str): Either 'python' (default) for the scalar sampling loop, or
+        'numpy' to draw samples in vectorized chunks. The numpy backend is only
+        avaliable for the 'mc-integral', 'circle-ratio', 'buffon' and 'laplace'
+        methods.
+        target_se (float): If given, draw batches of samples until the standard
+        error of the estimate reaches target_se, instead of using a fixed
+        sample size. Avaliable for the 'mc-integral', 'circle-ratio', 'buffon'
+        and 'laplace' methods. The standard error of the needle methods is
+        obtained with the delta method. With n_threads, every batch is split
+        across the threads.
+        max_samples (int): The sample budget when target_se is given. Defaults
+        to sample_size if given, or DEFAULT_MAX_SAMPLES.
+        sampler (str): Either 'random' (default) for independent uniform points,
+        or 'sobol' or 'halton' for scrambled low-discrepancy sequences, which
+        need far fewer samples for the same accuracy. The points are drawn in
+        vectorized blocks. Avaliable for the 'mc-integral' and 'circle-ratio'
+        methods, but not with target_se.
+        n_threads (int): The number of threads to split the samples across,
+        each drawing from its own independent PCG64 stream spawned from the
+        seed, in vectorized numpy chunks. The partial sums are merged in
+        order, so the result is deterministic for a given seed and number of
+        threads. -1 uses all CPUs. Avaliable for the 'mc-integral',
+        'circle-ratio', 'buffon' and 'laplace' methods.
+        seed: Every method accepts a seed, which may be an int, a numpy
+        SeedSequence or Generator, or a random.Random. Without a seed, fresh
+        entropy is drawn from the OS.
+        detailed (bool): Whether to return an EstimateResult with the estimate,
+        its standard error and 95% confidence interval, the number of samples,
+        the wall time and the samples per second, instead of the bare estimate.
+        For the 'mc-integral', 'circle-ratio', 'buffon' and 'laplace' methods,
+        the standard error comes from the variance of the scores of the same
+        samples, so the estimate is the same as without detailed. The
+        standard error is None where it is not avaliable, e.g. for
+        quasi-random samplers.
+        cache (ResultCache): A cache to serve repeated calls from, or True for
+        the default in-memory cache. Only calls with a seed are cached (or
+        any call of the deterministic 'chudnovsky' and 'newtons' methods),
+        and never with viz or detailed, whose timings are measured afresh,
+        or with output for 'chudnovsky'.
 
     Avaliable methods:
         - 'mc-integral': Monte-Carlo integration estimation.
@@ -28,21 +106,116 @@ def estimate(sample_size: int, method: str, viz = False, **kwargs):
         - 'newtons': Newton's method for calculating pi using sin(x).
 
     Returns:
-        float: The estimated value of pi.
+        float: The estimated value of pi. With target_se, a SequentialEstimate
+        holding the estimate, its standard error and the number of samples used.
+        With detailed, an EstimateResult.
     """
 
-    methods = {"mc-integral": MCIntegral, 
-               "circle-ratio": CircleRatio,
-               "drunkard": Drunkard, 
-               "buffon": BuffonsNeedle, 
-               "laplace": LaplaceNeedle,
-               "chudnovsky": Chudnovsky,
-               "newtons": Newtons}
-
-    method_key = method.lower()
+    method_key = method.lower() if method else None
     if method_key not in methods:
         raise ValueError(f"Invalid method. Must be one of {list(methods.keys())}.")
+
+    if cache and not viz and not detailed and kwargs.get("output") is None:
+        from .cache import get_cache
+
+        # -1 is resolved, as the thread streams depend on the number of threads
+        params = dict(sample_size=sample_size, method=method_key, backend=backend, target_se=target_se,
+                      max_samples=max_samples, sampler=sampler,
+                      n_threads=os.cpu_count() if n_threads == -1 else n_threads, **kwargs)
+        return get_cache(cache).call("estimate", params,
+                                     lambda: estimate(sample_size, method_key, viz, backend, target_se,
+                                                      max_samples, sampler, False, n_threads, **kwargs),
+                                     requires_seed=method_key not in deterministic_methods)
+
+    if backend != "python":
+        if method_key not in numpy_methods:
+            raise ValueError(f"The {backend} backend is only avaliable for {numpy_methods}.")
+        kwargs["backend"] = backend
+
+    if sampler != "random":
+        if method_key not in qmc_methods:
+            raise ValueError(f"The {sampler} sampler is only avaliable for {qmc_methods}.")
+        kwargs["sampler"] = sampler
+
+    if n_threads != 1:
+        if method_key not in threaded_methods:
+            raise ValueError(f"n_threads is only avaliable for {threaded_methods}.")
+        kwargs["n_threads"] = n_threads
+
+    if target_se is not None:
+        if method_key not in sequential_methods:
+            raise ValueError(f"target_se is only avaliable for {sequential_methods}.")
+        if viz:
+            print("WARNING: Visualization is not available with target_se." + "\n" +
+                  "Continuing without visualization.")
+        if max_samples is None:
+            max_samples = sample_size if sample_size is not None else DEFAULT_MAX_SAMPLES
+        estimator = load_method(method_key)(sample_size=max_samples, viz=False, **kwargs)
+        start = time.perf_counter()
+        result = estimator.estimate_until(target_se, max_samples)
+        if detailed:
+            return make_result(result, max_samples, time.perf_counter() - start)
+        return result
+
+    if sample_size is None:
+        raise ValueError("sample_size is required unless target_se is given.")
     
-    estimator = methods[method_key](sample_size=sample_size, viz=viz, **kwargs)
+    estimator = load_method(method_key)(sample_size=sample_size, viz=viz, **kwargs)
+
+    if detailed:
+        return _detailed_estimate(estimator, sample_size)
+    return estimator.estimate()
+
+def sweep(checkpoints, method: str, seed = None, **kwargs):
+    """
+    Estimate pi at every sample size of checkpoints in a single streaming
+    pass over one sample stream, to plot the convergence of a method for the
+    cost of its largest sample size. Only the running statistics of the
+    samples are kept, so memory does not grow with the sample sizes.
+
+    Args:
+        checkpoints (list): The increasing sample sizes to record the
+        estimate at. For 'drunkard', the numbers of steps after burn in of
+        each chain.
+        method (str): One of 'mc-integral', 'circle-ratio', 'buffon', 'laplace'
+        and 'drunkard'.
+        seed: The seed of the sample stream.
+        **kwargs: The options of the method, e.g. variance_reduction, kernel,
+        or n_chains and burn_in for 'drunkard'.
+
+    Returns:
+        list: For each checkpoint, a SequentialEstimate with the estimate, its
+        standard error and the number of samples. For 'drunkard', a
+        ChainEstimate, whose standard error and effective sample size come
+        from online batch means.
+    """
+    method_key = method.lower() if method else None
+    if method_key not in sweep_methods:
+        raise ValueError(f"sweep is only avaliable for {sweep_methods}.")
+    checkpoints = list(checkpoints)
+    if not checkpoints or checkpoints[0] < 1 or any(b <= a for a, b in zip(checkpoints, checkpoints[1:])):
+        raise ValueError("checkpoints must be increasing positive sample sizes.")
+    if kwargs.get("n_threads", 1) != 1:
+        raise ValueError("n_threads is not avaliable with sweep.")
+
+    estimator = load_method(method_key)(sample_size=checkpoints[-1], viz=False, seed=seed, **kwargs)
+    return estimator.sweep(checkpoints)
+
+def _detailed_estimate(estimator, sample_size):
+    """
+    Runs an estimate, timing it. Its standard error is measured from the
+    RunningStats of the scores the estimator keeps, so the estimate is the
+    same as without detailed. Estimators for which they cost an extra pass
+    over the scores only keep them when collect_stats is set.
+    """
+    if hasattr(estimator, "collect_stats"):
+        estimator.collect_stats = True
+    start = time.perf_counter()
+    result = estimator.estimate()
+    wall_time = time.perf_counter() - start
+    se = None
+    if getattr(estimator, "stats", None) is not None:
+        from .sampling import standard_error
 
-    return estimator.estimate()
\ No newline at end of file
+        se = standard_error(estimator, estimator.stats)
+    return make_result(result, sample_size, wall_time, se)
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""
+Records and enforces the import-time budget of pyeatspi.
+
+    python -m pyeatspi.importcheck [--budget-ms MS] [--repeat N] [--output FILE]
+
+Every scenario runs in a fresh interpreter, which times `import pyeatspi`
+and then checks which heavy dependencies the scenario pulled in. The check
+fails (exit code 1) if the import takes longer than the budget, or if a
+scenario imports a dependency it should not need.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Maximum time for `import pyeatspi`, in milliseconds
+IMPORT_BUDGET_MS = 25
+
+# Heavy dependencies which should only be imported when needed
+HEAVY_MODULES = ["numpy", "matplotlib", "tqdm"]
+
+# Code run after the import, and the heavy modules it is allowed to import
+SCENARIOS = {
+    "import": ("", []),
+    "chudnovsky": ("pyeatspi.estimate(100, 'chudnovsky')", []),
+    "laplace": ("pyeatspi.estimate(1000, 'laplace')", ["numpy"]),
+    "compare_std": ("pyeatspi.compare_std(100, 10, progress=False)", ["numpy"]),
+}
+
+_PROBE = """
+import contextlib, io, json, sys, time
+start = time.perf_counter()
+import pyeatspi
+import_ms = (time.perf_counter() - start) * 1000
+with contextlib.redirect_stdout(io.StringIO()):
+    exec({code!r})
+print(json.dumps({{"import_ms": import_ms,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def run_scenario(code, repeat):
+    """
+    Runs a scenario in repeat fresh interpreters.
+
+    Returns:
+        dict: The fastest import time in milliseconds, and the heavy modules
+        loaded by the scenario.
+    """
+    env = dict(os.environ)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [root, env.get("PYTHONPATH")]))
+
+    results = []
+    for _ in range(repeat):
+        probe = _PROBE.format(code=code, heavy=HEAVY_MODULES)
+        out = subprocess.run([sys.executable, "-c", probe], env=env, check=True,
+                             capture_output=True, text=True).stdout
+        results.append(json.loads(out.splitlines()[-1]))
+    return {"import_ms": min(r["import_ms"] for r in results),
+            "loaded": results[0]["loaded"]}
+
+
+def check(budget_ms = IMPORT_BUDGET_MS, repeat = 5):
+    """
+    Runs all scenarios against the budget.
+
+    Returns:
+        dict: The record of the run, with a list of failures.
+    """
+    record = {"budget_ms": budget_ms, "scenarios": {}, "failures": []}
+    for name, (code, allowed) in SCENARIOS.items():
+        result = run_scenario(code, repeat)
+        record["scenarios"][name] = result
+        for module in result["loaded"]:
+            if module not in allowed:
+                record["failures"].append(f"{name}: imports {module}")
+    import_ms = record["scenarios"]["import"]["import_ms"]
+    if import_ms > budget_ms:
+        record["failures"].append(f"import: {import_ms:.1f} ms is over the {budget_ms} ms budget")
+    return record
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the record to this JSON file.")
+    args = parser.parse_args(argv)
+
+    record = check(args.budget_ms, args.repeat)
+    for name, result in record["scenarios"].items():
+        loaded = ", ".join(result["loaded"]) or "-"
+        print(f"{name:<15} {result['import_ms']:8.1f} ms   loaded: {loaded}")
+    for failure in record["failures"]:
+        print("FAIL", failure)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(record, f, indent=2)
+
+    return 1 if record["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
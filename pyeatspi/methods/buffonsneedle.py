@@ -1,8 +1,10 @@
-import random
-from matplotlib import pyplot as plt
 import math
+import numpy as np
+from ..sampling import (NeedleEstimator, check_backend, check_kernel, check_threads, chunk_sizes,
+                        hit_stats, make_random, random_directions, threaded_sum)
+from ..rendering import DensityRaster, Reservoir
 
-class BuffonsNeedle:
+class BuffonsNeedle(NeedleEstimator):
     """
     Implements a Monte Carlo Simulation of Buffon's Needle problem, which 
     can estimate the value of pi. See
@@ -12,23 +14,53 @@ class BuffonsNeedle:
     strips of wood, each the same width, and we drop a needle onto the
     floor. What is the probability that the needle will lie across a 
     line between two strips?
+
+    With viz="raster", the needles are drawn in numpy chunks (whatever the
+    backend) with the angle kernel and a single thread, and their centers
+    binned into fixed-resolution density rasters, with a random
+    subsample of the needles drawn on top, so that large runs can be
+    visualized in bounded memory.
+
+    With kernel="vector", the needles are drawn in numpy chunks without any
+    trigonometric function: the direction of a needle is a random point
+    (gx, gy) of the unit disk, and its center is drawn directly as its
+    distance d to the nearest line, uniform on [0, line_spacing / 2]. The
+    needle crosses that line when d <= (needle_length / 2) * |gx| / |g|,
+    which is tested squared. With dtype="float32", the samples are drawn in
+    single precision, halving the memory traffic.
     """
 
-    def __init__(self, sample_size, viz):
+    def __init__(self, sample_size, viz, backend = "python", seed = None, n_threads = 1,
+                 kernel = "angle", dtype = "float64"):
+        check_backend(backend)
+        self.kernel = kernel
+        self.dtype = check_kernel(kernel, dtype)
         self.sample_size = sample_size
         self.viz = viz
+        self.backend = backend
+        self.seed = seed
+        self.n_threads = check_threads(n_threads)
         self.needle_length = 0.5
         self.line_spacing = 1.0
+        # RunningStats of the scores of the last estimate, for its standard error
+        self.stats = None
         self.needles = [] # for viz
 
     
     def estimate(self):
+        if self.viz == "raster":
+            return self._estimate_raster()
+
+        if self.backend == "numpy" or self.n_threads > 1 or self.kernel == "vector":
+            return self._estimate_numpy()
+
+        rand = make_random(self.seed)
         hits = 0
 
         for i in range(self.sample_size):
             # Generate random number starting point
-            x = random.uniform(0, 4)
-            theta = random.uniform(0, math.pi)
+            x = rand.uniform(0, 4)
+            theta = rand.uniform(0, math.pi)
 
             # Compute needle end point
             x_end = x + (self.needle_length / 2) * math.sin(theta)
@@ -43,39 +75,140 @@ class BuffonsNeedle:
 
             # These computations are only needed for viz
             if self.viz:
-                y = random.uniform(0, 4)
+                y = rand.uniform(0, 4)
                 y_start = y - (self.needle_length / 2) * math.cos(theta)
                 y_end = y + (self.needle_length / 2) * math.cos(theta)
                 # Add the needle to the list for viz
                 self.needles.append((x_start, x_end, y_start, y_end, crossed))
 
-        if hits == 0:
-            raise ValueError("No needles crossed a line. Try increasing the sample size!")
-        
-        # Estimate Pi
-        pi_est = (2 * self.needle_length * self.sample_size) / (self.line_spacing * hits)
+        self.stats = hit_stats(hits, self.sample_size)
+        pi_est = self._pi_from_hits(hits)
 
         if self.viz:
             self._viz(pi_est)
-        else:
-            return pi_est
+        return pi_est
+
+
+    def _estimate_numpy(self):
+        if self.viz:
+            print("WARNING: Visualization is not available for the numpy backend." + "\n" +
+                  "Continuing without visualization.")
+
+        hits = threaded_sum(self, self._make_rngs(), self.sample_size)
+        self.stats = hit_stats(hits, self.sample_size)
+
+        return self._pi_from_hits(hits)
+
+    def _estimate_raster(self):
+        # The needles are drawn from their angles to plot them, in one stream
+        if self.kernel != "angle" or self.n_threads > 1:
+            raise ValueError("viz=\"raster\" is only avaliable with kernel=\"angle\" and n_threads=1.")
+        rng = self._make_rng()
+        extent = (0, 4, 0, 4)
+        crossed_raster = DensityRaster(extent)
+        missed_raster = DensityRaster(extent)
+        # Needles are larger than points, so draw fewer of them
+        reservoir = Reservoir(size=300)
+        hits = 0
+
+        for n in chunk_sizes(self.sample_size):
+            # The angle kernel gives the positions and angles to draw
+            x, theta = self._draw_angle(rng, n)
+            crossed = self._score_angle(x, theta)
+            hits += np.count_nonzero(crossed)
+
+            # The y position does not affect the estimate, it is only drawn for viz
+            y = rng.uniform(0, 4, n)
+            crossed_raster.add(x[crossed], y[crossed])
+            missed_raster.add(x[~crossed], y[~crossed])
+
+            half_x = (self.needle_length / 2) * np.sin(theta)
+            half_y = (self.needle_length / 2) * np.cos(theta)
+            reservoir.add(x - half_x, x + half_x, y - half_y, y + half_y, crossed)
+
+        self.stats = hit_stats(hits, self.sample_size)
+        pi_est = self._pi_from_hits(hits)
+        self._viz_raster(pi_est, crossed_raster, missed_raster, reservoir)
+
+        return pi_est
+
+    def _pi_from_mean(self, mean):
+        if np.any(mean == 0):
+            raise ValueError("No needles crossed a line. Try increasing the sample size!")
+
+        # Estimate Pi
+        return (2 * self.needle_length) / (self.line_spacing * mean)
+
+    def _pi_slope(self, mean):
+        # Derivative of _pi_from_mean, for the delta method standard error
+        return -(2 * self.needle_length) / (self.line_spacing * mean**2)
 
+    def _draw_vector(self, rng, size):
+        distance = rng.random(size, dtype=self.dtype) * (self.line_spacing / 2)
+        return (distance,) + random_directions(rng, size, self.dtype)
+
+    def _score_vector(self, distance, gx, norm):
+        # distance <= (needle_length / 2) * |gx| / sqrt(norm), squared
+        half_length = self.dtype.type(self.needle_length / 2)
+        return distance * distance * norm <= half_length * half_length * (gx * gx)
+
+    def _draw_angle(self, rng, size):
+        return rng.uniform(0, 4, size), rng.uniform(0, math.pi, size)
+
+    def _score_angle(self, x, theta):
+        half_width = (self.needle_length / 2) * np.sin(theta)
+        x_start = x - half_width
+        x_end = x + half_width
+        return np.floor(x_start / self.line_spacing) != np.floor(x_end / self.line_spacing)
 
     def _viz(self, pi_est):
+        from matplotlib import pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(8, 6))
+
+        # Draw vertical lines
+        for i in range(int(4 / self.line_spacing) + 1):
+            ax.axvline(i * self.line_spacing, color="black", linestyle="--", alpha=0.6)
+
+        # Plot all the needles as one collection
+        self._plot_needles(ax, *np.array(self.needles, dtype=float).reshape(-1, 5).T, lw=2)
+
+        # Label the plot
+        fig.suptitle('Buffon\'s Needle Simulation with {} samples'.format(self.sample_size))
+        ax.set_title(f"Estimated value of pi = {pi_est:.4f}")
+        ax.set_xlabel("X Position")
+        ax.set_ylabel("Y Position")
+        plt.show()
+
+    def _viz_raster(self, pi_est, crossed_raster, missed_raster, reservoir):
+        from matplotlib import pyplot as plt
+
         fig, ax = plt.subplots(figsize=(8, 6))
 
+        # Plot the density of the needle centers
+        crossed_raster.show(ax, "#7846B4", label="Crossed a line")
+        missed_raster.show(ax, "#6FAF22", label="Missed the lines")
+
         # Draw vertical lines
         for i in range(int(4 / self.line_spacing) + 1):
             ax.axvline(i * self.line_spacing, color="black", linestyle="--", alpha=0.6)
 
-        # Plot each needle
-        for x_start, x_end, y_start, y_end, crossed in self.needles:
-            color = "#7846B4" if crossed else "#6FAF22"
-            ax.plot([x_start, x_end], [y_start, y_end], color=color, lw=2)
+        # Plot a subsample of the needles on top
+        self._plot_needles(ax, *reservoir.columns(), lw=1)
 
         # Label the plot
         fig.suptitle('Buffon\'s Needle Simulation with {} samples'.format(self.sample_size))
         ax.set_title(f"Estimated value of pi = {pi_est:.4f}")
         ax.set_xlabel("X Position")
         ax.set_ylabel("Y Position")
+        ax.legend(loc="upper right")
         plt.show()
+
+    def _plot_needles(self, ax, x_start, x_end, y_start, y_end, crossed, lw):
+        from matplotlib.collections import LineCollection
+
+        segments = np.stack([np.column_stack([x_start, y_start]),
+                             np.column_stack([x_end, y_end])], axis=1)
+        colors = np.where(crossed.astype(bool), "#7846B4", "#6FAF22")
+        ax.add_collection(LineCollection(segments, colors=colors, linewidths=lw))
+        ax.autoscale_view()
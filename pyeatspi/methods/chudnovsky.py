@@ -1,59 +1,434 @@
 import decimal
+import math
+import os
+from ..digitstore import DigitStore
+from ..profiling import phase
+
+# Constants of the Chudnovsky series
+A = 13591409
+B = 545140134
+C3_OVER_24 = 640320**3 // 24
+
+# Every term of the series adds about log10(640320**3 / 1728) digits
+DIGITS_PER_TERM = 14.181647462725477
+
+# Terms of the series below which the splitting is not worth parallelizing
+PARALLEL_MIN_TERMS = 10_000
+
+# Number of ranges split by each worker process. Using more ranges than
+# workers balances the load, as the terms get larger along the series.
+RANGES_PER_JOB = 4
+
+# Extra digits computed past the requested precision. They are dropped from
+# the result, and only used to check that the last returned digit is exact.
+GUARD_DIGITS = 12
+
+# Largest number of digits converted to a string at once when writing
+# digits to a file
+OUTPUT_CHUNK_DIGITS = 1 << 16
 
 class Chudnovsky:
     """
-    Implements Chudnovsky algorithm for calculating pi to a given number of 
+    Implements Chudnovsky algorithm for calculating pi to a given number of
     decimal places. Chudnovsky is an exact method, so sample_size arg is used
     to specify the number of decimal places to calculate pi to.
+
+    The series is summed by binary splitting over integers: the sum of the
+    terms in [a, b) is represented by the three integers P(a, b), Q(a, b) and
+    T(a, b), and neighbouring ranges are merged with a handful of big integer
+    multiplications. The square root of 10005 and the final division are
+    computed with Newton iterations in binary fixed point, so the only
+    expensive operations are multiplications.
+
+    With store, a DigitStore or the path of its directory, results are kept
+    on disk. Requests for at most the stored number of digits are sliced
+    from the stored digits without any computation, and larger requests
+    resume the series from its saved binary splitting state.
+
+    With n_jobs > 1, the range of terms is split into contiguous ranges
+    whose (P, Q, T) are computed in a pool of n_jobs worker processes, and
+    merged in order in the parent as they come in. -1 uses all CPUs.
+
+    With output, a path or a text file-like object, the digits ("3.1415...")
+    are also written there by write(), in chunks of at most
+    OUTPUT_CHUNK_DIGITS digits, so no string of all the digits is built.
+    digits(start, count) returns a slice of the digits in the same way.
+
+    seed is accepted like for the other methods, but unused, as the method
+    is exact.
     """
 
-    def __init__(self, sample_size, viz):
+    def __init__(self, sample_size, viz, store = None, n_jobs = 1, seed = None, output = None):
         self.sample_size = sample_size
         self.viz = viz
+        self.seed = seed
+        self.store = DigitStore(store) if isinstance(store, (str, os.PathLike)) else store
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        elif n_jobs < 1:
+            raise ValueError("n_jobs must be a positive integer, or -1 for all CPUs.")
+        self.n_jobs = n_jobs
+        self.output = output
+        # Binary splitting integers (n_terms, P, Q, T) of the terms summed so far
+        self.state = None
+        # The last result, as (digits, floor(pi * 10**digits) as a Decimal)
+        self.result = None
 
     def estimate(self):
-        print("Calculating pi using Chudnovsky method to " + str(self.sample_size) 
+        print("Calculating pi using Chudnovsky method to " + str(self.sample_size)
               + " decimal places.")
         if self.viz:
             print("WARNING: Visualization is not available for Chudnovsky method." + "\n" +
                   "Continuing without visualization.")
-        if self.sample_size > 100000:
-            print("Decimal places past 100,000 not recommended.")
-
-        # initalize k to 0
-        k = 0
-
-        # Intialize number of decimal places
-        decimal.getcontext().prec = self.sample_size
-
-        return self.num()/self.den(k)
-        
-    def fact(self, n):
-        """Basic recursive factorial calculation.
-        Not recommended for large n, but ok under 1 million."""
-        if n == 0:
-            return 1
-        else:
-            return n * self.fact(n - 1)
-
-    def den(self, k):
-        """Calculates the deonminator of the Chudnovsky algorithm."""
-        a = decimal.Decimal(self.fact(6*k)*(545140134*k+13591409))
-        b = decimal.Decimal(self.fact(3*k)*(self.fact(k)**3)*((-262537412640768000)**k))
-        res = a / b
-        if k > 0:
-            return res + self.den(k - 1)
+
+        digits = self.sample_size
+        with decimal.localcontext() as ctx:
+            ctx.prec = digits + 1
+            if self.store is not None:
+                pi = decimal.Decimal(self._read_store(digits)).scaleb(-digits)
+            else:
+                pi = self.pi_decimal(digits).scaleb(-digits)
+
+        if self.output is not None:
+            self.write(self.output)
+        return pi
+
+    def write(self, output, chunk_digits = OUTPUT_CHUNK_DIGITS):
+        """
+        Writes pi to sample_size decimal places ("3.1415...") to output, a
+        path or a text file-like object. The digits are cut into chunks of at
+        most chunk_digits digits with exact decimal shifts (or read in chunks
+        from the store), so no string of all the digits is built.
+
+        Returns:
+            int: The number of decimal places written.
+        """
+        if isinstance(output, (str, os.PathLike)):
+            with open(os.path.expanduser(output), "w") as f:
+                return self.write(f, chunk_digits)
+
+        digits = self.sample_size
+        with phase("write"):
+            output.write("3.")
+            if self.store is not None:
+                self._extend_store(digits)
+                for start in range(1, digits + 1, chunk_digits):
+                    output.write(self.store.slice(start, min(chunk_digits, digits + 1 - start)))
+            else:
+                # The decimal places, without the leading 3
+                ctx = _exact()
+                places = ctx.subtract(self.pi_decimal(digits), ctx.scaleb(3, digits))
+                _write_digits(output.write, places, digits, chunk_digits)
+        return digits
+
+    def digits(self, start, count):
+        """
+        Returns the count digits of pi from position start of "31415...",
+        where position 0 is the 3 and position i > 0 the i-th decimal place.
+        pi is computed to start + count - 1 places if needed (or read from
+        the store), and the slice is cut out with exact decimal shifts,
+        without converting the other digits to a string.
+        """
+        if start < 0 or count < 0:
+            raise ValueError("start and count must be non-negative.")
+        if count == 0:
+            return ""
+        last = start + count - 1
+        if self.store is not None:
+            self._extend_store(last)
+            return self.store.slice(start, count)
+
+        digits = max(last, self.result[0]) if self.result is not None else last
+        # Drop the places after the slice, then the digits before it
+        head = _shift_down(self.pi_decimal(digits), digits - last)
+        ctx = _exact()
+        piece = ctx.subtract(head, _shift_down(head, count).scaleb(count, ctx))
+        return str(piece).zfill(count)
+
+    def pi_decimal(self, digits):
+        """
+        Returns floor(pi * 10**digits) as an integral Decimal. The last
+        result is kept, and requests for fewer digits truncate it.
+        """
+        if self.result is not None and self.result[0] >= digits:
+            return _shift_down(self.result[1], self.result[0] - digits)
+
+        pi_int = self.pi_floor(digits)
+        with phase("convert"):
+            value = _int_to_decimal(pi_int)
+        self.result = (digits, value)
+        return value
+
+    def _read_store(self, digits):
+        """
+        Returns the digits of pi from the store, extending it first if it
+        holds fewer than digits decimal places.
+        """
+        text = self.store.read(digits)
+        if text is None:
+            self._extend_store(digits)
+            text = self.store.read(digits)
+        return text
+
+    def _extend_store(self, digits):
+        """Extends the store to at least digits decimal places, if it holds fewer."""
+        # An empty store also has 0 decimal places, so check for the last digit
+        if self.store.slice(digits, 1) is not None:
+            return
+
+        with self.store.lock():
+            # Another process may have extended the store in the meantime
+            if self.store.slice(digits, 1) is None:
+                self.state = self.store.load_state()
+                value = self.pi_decimal(digits)
+                self.store.save_state(self.state)
+                self.store.write(str(value))
+
+    def pi_floor(self, digits):
+        """Returns floor(pi * 10**digits) as an integer."""
+        guard = GUARD_DIGITS
+        while True:
+            pi_int = self.pi_scaled(digits + guard)
+            # The scaled value is within 2 units of floor(pi * 10**(digits + guard)).
+            # Only truncate if that error cannot reach the last returned digit.
+            pi_int, rest = divmod(pi_int, 10**guard)
+            if 2 < rest < 10**guard - 2:
+                break
+            guard *= 2
+        return pi_int
+
+    def pi_scaled(self, digits):
+        """Returns pi * 10**digits as an integer, with an error of at most 2 units."""
+        with phase("split"):
+            _, Q, T = self.series(int(digits / DIGITS_PER_TERM) + 2)
+        with phase("divide"):
+            return _pi_from_series(Q, T, digits)
+
+    def series(self, n_terms):
+        """
+        Returns the binary splitting integers (P, Q, T) of at least the first
+        n_terms terms. The terms already summed are reused, and only the new
+        ones are split and merged in.
+        """
+        if self.state is not None and self.state[0] >= n_terms:
+            return self.state[1:]
+
+        if self.state is None:
+            P, Q, T = self.split(0, n_terms)
         else:
-            return res
+            n = self.state[0]
+            P, Q, T = _merge(self.state[1:], self.split(n, n_terms))
+        self.state = (n_terms, P, Q, T)
+        return P, Q, T
+
+    def split(self, a, b):
+        """Computes (P, Q, T) for the terms in [a, b), in parallel if n_jobs > 1."""
+        if self.n_jobs > 1 and b - a >= PARALLEL_MIN_TERMS:
+            return self.parallel_split(a, b)
+        return self.binary_split(a, b)
+
+    def parallel_split(self, a, b):
+        """
+        Computes (P, Q, T) for the terms in [a, b) in a pool of n_jobs worker
+        processes, each splitting a contiguous range of terms.
+
+        Finished ranges are merged in order as soon as their left neighbour
+        is in, with equal-sized neighbours merged first as in the binary
+        splitting tree. So at most log2(ranges) partial results are kept,
+        plus those of the at most 2 * n_jobs ranges in flight.
+        """
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+        n_ranges = RANGES_PER_JOB * self.n_jobs
+        bounds = [a + (b - a) * i // n_ranges for i in range(n_ranges + 1)]
+        ranges = iter(range(n_ranges))
+        futures = {}
+        done_ranges = {}
+        next_range = 0
+        # Merged results of consecutive ranges, as (number of ranges, (P, Q, T))
+        stack = []
+
+        with ProcessPoolExecutor(max_workers=self.n_jobs) as pool:
+            def submit():
+                i = next(ranges, None)
+                if i is not None:
+                    futures[pool.submit(_binary_split, bounds[i], bounds[i + 1])] = i
+
+            for _ in range(2 * self.n_jobs):
+                submit()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    done_ranges[futures.pop(future)] = future.result()
+                    submit()
+                while next_range in done_ranges:
+                    size, result = 1, done_ranges.pop(next_range)
+                    while stack and stack[-1][0] == size:
+                        left_size, left = stack.pop()
+                        size, result = left_size + size, _merge(left, result)
+                    stack.append((size, result))
+                    next_range += 1
+
+        _, result = stack.pop()
+        while stack:
+            _, left = stack.pop()
+            result = _merge(left, result)
+        return result
+
+    def binary_split(self, a, b):
+        """
+        Computes the integers (P, Q, T) for the terms in [a, b) of the series.
+        The recursion depth is log2(b - a).
+        """
+        if b - a == 1:
+            if a == 0:
+                P = Q = 1
+            else:
+                P = (6*a - 5) * (2*a - 1) * (6*a - 1)
+                Q = a * a * a * C3_OVER_24
+            T = P * (A + B * a)
+            if a & 1:
+                T = -T
+            return P, Q, T
+
+        m = (a + b) // 2
+        return _merge(self.binary_split(a, m), self.binary_split(m, b))
+
+
+def _merge(left, right):
+    """Merges the (P, Q, T) of two neighbouring ranges of terms, left first."""
+    P1, Q1, T1 = left
+    P2, Q2, T2 = right
+    return P1 * P2, Q1 * Q2, T1 * Q2 + P1 * T2
+
+
+def _binary_split(a, b):
+    """Computes (P, Q, T) for the terms in [a, b). Executed in the workers."""
+    return Chudnovsky(sample_size=0, viz=False).binary_split(a, b)
+
+
+def _shift(x, bits):
+    """Shifts x right by bits, or left if bits is negative."""
+    return x >> bits if bits >= 0 else x << -bits
+
+
+def _precisions(bits):
+    """
+    Returns the precisions of a Newton iteration reaching bits, starting
+    from the precision of a float. Each precision is a few bits short of
+    twice the previous, so rounding errors do not build up.
+    """
+    precs = [bits]
+    while precs[-1] > 50:
+        precs.append(precs[-1] // 2 + 4)
+    return precs[::-1]
+
+
+def _isqrt_inverse(n, bits):
+    """Returns floor(2**bits / sqrt(n)) up to a few units, for a small integer n."""
+    # Carry extra bits so that r always has prec significant bits
+    extra = (n.bit_length() + 1) // 2
+    precs = _precisions(bits)
+    prec = precs[0]
+    r = int(2**(prec + extra) / math.sqrt(n))
+    for new_prec in precs[1:]:
+        # Newton step for 1/sqrt(n): r += r * (1 - n * r**2) / 2. The
+        # correction only needs the precision of the current r, so every
+        # product is computed at half the new precision.
+        err = (1 << 2*(prec + extra)) - n * r * r
+        r = (r << (new_prec - prec)) + ((r * err) >> (3*prec + 2*extra + 1 - new_prec))
+        prec = new_prec
+    return r >> extra
+
+
+def _reciprocal(x, bits):
+    """Returns about 2**(2*bits) / (x >> (x.bit_length() - bits))."""
+    length = x.bit_length()
+    precs = _precisions(bits)
+    prec = precs[0]
+    r = (1 << 2*prec) // _shift(x, length - prec)
+    for new_prec in precs[1:]:
+        # Newton step for 1/x: r += r * (1 - x * r), keeping only the
+        # leading prec bits of the error term.
+        err = (1 << (prec + new_prec)) - _shift(x, length - new_prec) * r
+        err >>= new_prec - prec
+        r = (r << (new_prec - prec)) + ((r * err) >> (3*prec - new_prec))
+        prec = new_prec
+    return r
+
+
+def _pi_from_series(Q, T, digits):
+    """Returns pi * 10**digits from the binary splitting integers Q and T."""
+    bits = int(digits * math.log2(10)) + 64
+    work = bits + 32
+
+    # Only the leading work bits of Q and T matter for their ratio
+    drop = T.bit_length() - work
+    Q = _shift(Q, drop)
+    T = _shift(T, drop)
+
+    sqrt_10005 = 10005 * _isqrt_inverse(10005, work)
+    inverse_T = _reciprocal(T, work)
+    pi_fixed = (((426880 * sqrt_10005 * Q) >> work) * inverse_T) >> work
+
+    return (pi_fixed * 10**digits) >> work
+
+
+def _exact():
+    """Returns a decimal context in which integer arithmetic is exact."""
+    ctx = decimal.Context(prec=decimal.MAX_PREC, Emax=decimal.MAX_EMAX,
+                          Emin=decimal.MIN_EMIN)
+    ctx.traps[decimal.Inexact] = True
+    return ctx
+
+
+def _shift_down(value, k):
+    """Returns floor(value / 10**k) for a non-negative integral Decimal, in linear time."""
+    if k == 0:
+        return value
+    ctx = _exact()
+    return ctx.scaleb(value, -k).to_integral_value(rounding=decimal.ROUND_DOWN, context=ctx)
+
+
+def _write_digits(write, value, n_digits, chunk_digits):
+    """
+    Writes a non-negative integral Decimal below 10**n_digits as n_digits
+    digits, zero padded, calling write with chunks of at most chunk_digits
+    digits. The value is split in halves by powers of ten, which are exact
+    decimal shifts, so the conversion takes O(n log n) time.
+    """
+    if n_digits <= chunk_digits:
+        write(str(value).zfill(n_digits) if n_digits else "")
+        return
+    low_digits = n_digits // 2
+    high = _shift_down(value, low_digits)
+    ctx = _exact()
+    low = ctx.subtract(value, high.scaleb(low_digits, ctx))
+    _write_digits(write, high, n_digits - low_digits, chunk_digits)
+    _write_digits(write, low, low_digits, chunk_digits)
+
+
+def _int_to_decimal(n):
+    """
+    Converts a non-negative integer to a Decimal. Decimal(n) is quadratic in
+    the number of digits, so split n in binary and combine the halves with
+    decimal multiplications by cached powers of two.
+    """
+    ctx = _exact()
+    powers = {}
 
-    def num(self):
-        """Calculates the numerator of the Chudnovsky algorithm.
-        root_precision is the number of significant digits to use when 
-        calculating the root."""
-        p = decimal.getcontext().prec
+    def pow2(w):
+        if w not in powers:
+            powers[w] = ctx.power(decimal.Decimal(2), w)
+        return powers[w]
 
-        # Update the percision
-        decimal.getcontext().prec = self.sample_size
-        decimal.getcontext().prec = p
+    def convert(n, w):
+        if w <= 4096:
+            return decimal.Decimal(n)
+        half = w >> 1
+        hi = n >> half
+        lo = n - (hi << half)
+        return ctx.add(ctx.multiply(convert(hi, w - half), pow2(half)),
+                       convert(lo, half))
 
-        return 426880 * decimal.Decimal(10005).sqrt()
+    return convert(n, n.bit_length())
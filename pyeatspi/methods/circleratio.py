@@ -1,11 +1,25 @@
-import random
-from matplotlib import pyplot as plt
 import numpy as np
+from ..sampling import (SampledEstimator, check_backend, check_threads, chunk_sizes, hit_stats, make_random,
+                        threaded_sum)
+from ..qmc import check_sampler
+from ..rendering import DensityRaster, Reservoir, square_and_circle
 
-class CircleRatio:
-    def __init__(self, sample_size, viz):
+class CircleRatio(SampledEstimator):
+    dim = 2
+
+    def __init__(self, sample_size, viz, backend = "python", seed = None, sampler = "random",
+                 n_threads = 1):
+        check_backend(backend)
+        check_sampler(sampler)
         self.sample_size = sample_size
         self.viz = viz
+        self.backend = backend
+        self.seed = seed
+        self.sampler = sampler
+        self.n_threads = check_threads(n_threads)
+        # RunningStats of the scores of the last estimate, for its standard
+        # error. None with a quasi-random sampler.
+        self.stats = None
         self.inside_x = []
         self.inside_y = []
         self.outside_x = []
@@ -24,13 +38,30 @@ class CircleRatio:
         We know the area of a circle is pi*r^2 and the area of a square is 4*r^2.
         Therefore, the ratio of the areas is pi/4. So, we can estimate pi by
         multiplying the ratio by 4.
+
+        With viz="raster", the samples are drawn in numpy chunks (whatever
+        the backend) in a single thread, and binned into fixed-resolution
+        density rasters as they stream in, so that large runs can be
+        visualized in bounded memory.
+
+        With sampler="sobol" or sampler="halton", the points are taken from a
+        scrambled low-discrepancy sequence instead, drawn in vectorized
+        blocks. They cover the square more evenly than independent points,
+        so the error shrinks faster with the sample size.
         """
+        if self.viz == "raster":
+            return self._estimate_raster()
+
+        if self.backend == "numpy" or self.sampler != "random" or self.n_threads > 1:
+            return self._estimate_numpy()
+
+        rand = make_random(self.seed)
         circle_points = 0
         
         if self.viz:
             for _ in range(self.sample_size):
-                x = random.uniform(-1, 1)
-                y = random.uniform(-1, 1)
+                x = rand.uniform(-1, 1)
+                y = rand.uniform(-1, 1)
 
                 if x**2 + y**2 <= 1:
                     circle_points += 1
@@ -41,20 +72,92 @@ class CircleRatio:
                     self.outside_y.append(y)
         else:
             for i in range(self.sample_size):
-                x = random.uniform(-1, 1)
-                y = random.uniform(-1, 1)
+                x = rand.uniform(-1, 1)
+                y = rand.uniform(-1, 1)
 
                 if x**2 + y**2 <= 1:
                     circle_points += 1
 
+        self.stats = hit_stats(circle_points, self.sample_size)
         pi_est = 4 * circle_points / self.sample_size
 
         if self.viz:
             self._viz(pi_est)
-        else:
-            return pi_est
+        return pi_est
     
+    def _estimate_numpy(self):
+        if self.viz:
+            print("WARNING: Visualization is only available as viz=\"raster\" for the numpy" + "\n" +
+                  "backend and quasi-random samplers. Continuing without visualization.")
+
+        circle_points = threaded_sum(self, self._make_rngs(), self.sample_size)
+        if self.sampler == "random":
+            self.stats = hit_stats(circle_points, self.sample_size)
+
+        return 4 * circle_points / self.sample_size
+
+    def _estimate_raster(self):
+        if self.n_threads > 1:
+            raise ValueError("viz=\"raster\" is only avaliable with n_threads=1.")
+        rng = self._make_rng()
+        extent = (-1, 1, -1, 1)
+        inside_raster = DensityRaster(extent)
+        outside_raster = DensityRaster(extent)
+        reservoir = Reservoir()
+        circle_points = 0
+
+        for n in chunk_sizes(self.sample_size):
+            x, y = self._draw(rng, n)
+            inside = self._score(x, y)
+            circle_points += np.count_nonzero(inside)
+            inside_raster.add(x[inside], y[inside])
+            outside_raster.add(x[~inside], y[~inside])
+            reservoir.add(x, y, inside)
+
+        if self.sampler == "random":
+            self.stats = hit_stats(circle_points, self.sample_size)
+        pi_est = 4 * circle_points / self.sample_size
+        self._viz_raster(pi_est, inside_raster, outside_raster, reservoir)
+
+        return pi_est
+
+    def _pi_from_mean(self, mean):
+        return 4 * mean
+
+    def _pi_slope(self, mean):
+        return 4
+
+    def _draw(self, rng, size):
+        if self.sampler != "random":
+            x, y = rng.random(size)
+            return 2 * x - 1, 2 * y - 1
+        return rng.uniform(-1, 1, size), rng.uniform(-1, 1, size)
+
+    def _score(self, x, y):
+        return x**2 + y**2 <= 1
+
+    def _viz_raster(self, pi_est, inside_raster, outside_raster, reservoir):
+        from matplotlib import pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(6, 6))
+        inside_raster.show(ax, "#6FAF22", label="Inside circle")
+        outside_raster.show(ax, "#7846B4", label="Outside circle")
+
+        # Draw a subsample of the points on top
+        x, y, inside = reservoir.columns()
+        inside = inside.astype(bool)
+        ax.scatter(x[inside], y[inside], color="#6FAF22", edgecolors="white", linewidths=0.3, s=5)
+        ax.scatter(x[~inside], y[~inside], color="#7846B4", edgecolors="white", linewidths=0.3, s=5)
+
+        square_and_circle(ax)
+        fig.suptitle('Circle Ratio Simulation with {} samples'.format(self.sample_size))
+        ax.set_title(f"Estimated value of pi = {pi_est:.4f}")
+        ax.legend()
+        plt.show()
+
     def _viz(self, pi_est):
+        from matplotlib import pyplot as plt
+
         fig, ax = plt.subplots(figsize=(6, 6))
         ax.scatter(self.inside_x, self.inside_y, color="#6FAF22", s=5, label="Inside circle")
         ax.scatter(self.outside_x, self.outside_y, color="#7846B4", s=5, label="Outside circle")
@@ -1,6 +1,32 @@
-import random
-from matplotlib import pyplot as plt
 import numpy as np
+import math
+import time
+from itertools import islice
+from ..sampling import (TILE_SIZE, AdaptiveChainEstimate, BatchMeans, ChainEstimate, chunk_sizes,
+                        make_random, make_rng, split_rhat)
+from ..profiling import phase
+from ..rendering import BUFFER_SIZE, DensityRaster, Reservoir, square_and_circle
+
+# Number of batches each chain is split into for the batch means estimate
+# of the standard error in multi-chain mode.
+BATCHES_PER_CHAIN = 10
+
+# Acceptance rate the adaptive mode tunes step_size toward. For the uniform
+# distribution over the square, the autocorrelation of the steps inside the
+# circle is lowest around this rate (a step size near 0.9), about a quarter
+# of its value for the default step size of 0.2.
+TARGET_ACCEPTANCE = 0.6
+
+# Steps between two Robbins-Monro updates of the step size
+ADAPT_INTERVAL = 50
+
+# Length of the first burn in stage of the adaptive mode. Every stage is
+# twice as long as the previous one, so the last stage covers the second
+# half of the burn in.
+FIRST_STAGE = 1000
+
+# Burn in ends once the split R-hat of a stage is below this
+RHAT_THRESHOLD = 1.01
 
 class Drunkard:
     """
@@ -16,13 +42,36 @@ class Drunkard:
     The ratio of the points inside the circle times 4 over the total 
     number of steps taken is an estimate of pi. We simulate this by creating
     a markov chain with a stationary distribution over a [-1, 1] x [-1, 1] square.
+
+    With n_chains, that many independent walkers of sample_size steps each
+    (including burn_in) are advanced together as arrays. The estimate then
+    pools all chains and reports its batch means standard error and effective
+    sample size, as the steps of a chain are autocorrelated.
+
+    With viz="raster", the visited points are binned into fixed-resolution
+    density rasters as the walk goes, instead of being kept for plotting, so
+    that long walks can be visualized in bounded memory.
+
+    With adaptive, the chains (n_chains, or a single one) start from the
+    corners of the square, and the burn in runs in stages of doubling
+    length. During burn in, step_size is tuned with Robbins-Monro updates
+    toward target_acceptance, and the burn in ends once the split R-hat of a
+    stage is below RHAT_THRESHOLD (after at least burn_in steps, and at most
+    half of sample_size, which burn_in must not exceed). The step size is
+    then frozen, so the rest of the walk is a valid Markov chain, and the
+    result is an AdaptiveChainEstimate.
     """
 
-    def __init__(self, sample_size, viz, step_size = 0.2, burn_in = 0):
+    def __init__(self, sample_size, viz, step_size = 0.2, burn_in = 0, seed = None,
+                 n_chains = None, adaptive = False, target_acceptance = TARGET_ACCEPTANCE):
         self.sample_size = sample_size
         self.viz = viz
         self.step_size = step_size
         self.burn_in = burn_in
+        self.seed = seed
+        self.n_chains = n_chains
+        self.adaptive = adaptive
+        self.target_acceptance = target_acceptance
         # for viz
         self.xs = []
         self.ys = []
@@ -34,12 +83,25 @@ class Drunkard:
         self.burn_ys = []
 
     def estimate(self):
+        if self.adaptive:
+            return self._estimate_adaptive()
+        if self.n_chains is not None:
+            return self._estimate_chains()
+
+        rand = make_random(self.seed)
         num_inside = 0
         x, y = 0, 0
 
+        if self.viz == "raster":
+            extent = (-1, 1, -1, 1)
+            rasters = {"burn": DensityRaster(extent), "inside": DensityRaster(extent),
+                       "outside": DensityRaster(extent)}
+            reservoir = Reservoir()
+            buffer_x, buffer_y = [], []
+
         for i in range(self.sample_size):
-            dx = random.uniform(-self.step_size, self.step_size)
-            dy = random.uniform(-self.step_size, self.step_size)
+            dx = rand.uniform(-self.step_size, self.step_size)
+            dy = rand.uniform(-self.step_size, self.step_size)
             proposal_x = x + dx
             proposal_y = y + dy
 
@@ -52,7 +114,13 @@ class Drunkard:
                 num_inside += 1
 
             # these computations are only needed for viz
-            if self.viz:
+            if self.viz == "raster":
+                buffer_x.append(x)
+                buffer_y.append(y)
+                if len(buffer_x) == BUFFER_SIZE:
+                    self._bin_steps(i + 1 - BUFFER_SIZE, buffer_x, buffer_y, rasters, reservoir)
+                    buffer_x, buffer_y = [], []
+            elif self.viz:
                 self.xs.append(x)
                 self.ys.append(y)
 
@@ -69,13 +137,298 @@ class Drunkard:
         
         pi_est = 4 * num_inside / (self.sample_size - self.burn_in)
 
-        if self.viz:
+        if self.viz == "raster":
+            self._bin_steps(self.sample_size - len(buffer_x), buffer_x, buffer_y, rasters, reservoir)
+            self._viz_raster(pi_est, rasters, reservoir, (x, y))
+            return pi_est
+        elif self.viz:
             return self._viz(pi_est)
         else:
             return pi_est
     
 
+    def estimate_many(self, n_replicates):
+        """
+        Returns an array of n_replicates independent estimates of pi. Each
+        replicate is its own chain of sample_size steps, and all the chains
+        are advanced together as arrays.
+        """
+        if self.adaptive:
+            raise ValueError("adaptive is not avaliable with estimate_many.")
+        num_inside = self._walk(make_rng(self.seed), n_replicates)[0]
+        return 4 * num_inside / (self.sample_size - self.burn_in)
+
+    def _estimate_chains(self):
+        """
+        Pools n_chains chains into one estimate, with its batch means standard
+        error and effective sample size.
+        """
+        if self.viz:
+            print("WARNING: Visualization is not available with multiple chains." + "\n" +
+                  "Continuing without visualization.")
+
+        n_post = self.sample_size - self.burn_in
+        n_batches = min(BATCHES_PER_CHAIN, n_post)
+        counts = self._walk(make_rng(self.seed), self.n_chains, n_batches)
+        return _pooled_estimate(counts, n_post)
+
+    def _estimate_adaptive(self):
+        """
+        Tunes the step size and detects the burn in, then pools the chains
+        into one estimate like _estimate_chains, reporting the diagnostics
+        of the walk after burn in.
+        """
+        if self.viz:
+            print("WARNING: Visualization is not available with adaptive." + "\n" +
+                  "Continuing without visualization.")
+
+        max_burn_in = self.sample_size // 2
+        if self.burn_in > max_burn_in:
+            raise ValueError(f"burn_in must be at most half of sample_size ({max_burn_in}) with adaptive.")
+
+        rng = make_rng(self.seed)
+        n_chains = self.n_chains or 1
+        # Overdispersed starts, cycling through the corners of the square
+        index = np.arange(n_chains)
+        x = np.where(index % 2 == 0, -1.0, 1.0)
+        y = np.where(index // 2 % 2 == 0, -1.0, 1.0)
+
+        log_step = math.log(self.step_size)
+        updates = 0
+        burn_in = 0
+        stage = FIRST_STAGE
+        rhat = math.inf
+        while burn_in < max_burn_in:
+            n = min(stage, max_burn_in - burn_in)
+            # Sums and sums of squares of x, y and the inside indicator over
+            # each half of the stage
+            sums = np.zeros((2, 3, n_chains))
+            squares = np.zeros((2, 3, n_chains))
+            for first in range(0, n, ADAPT_INTERVAL):
+                m = min(ADAPT_INTERVAL, n - first)
+                step_size = math.exp(log_step)
+                with phase("draw"):
+                    steps = rng.uniform(-step_size, step_size, (m, 2, n_chains))
+                with phase("test"):
+                    accepted = 0
+                    for i, (dx, dy) in enumerate(steps):
+                        accepted += int(np.count_nonzero(self._move(x, y, dx, dy)))
+                        values = np.stack([x, y, x**2 + y**2 <= 1])
+                        half = 2 * (first + i) // n
+                        sums[half] += values
+                        squares[half] += values**2
+
+                # Robbins-Monro step on the log of the step size, with gains
+                # decreasing slowly enough to reach the target from any start
+                updates += 1
+                log_step += (accepted / (m * n_chains) - self.target_acceptance) / updates**0.6
+
+            burn_in += n
+            if n >= 4:
+                rhat = split_rhat(sums, squares, (n // 2, n - n // 2))
+            if rhat < RHAT_THRESHOLD and burn_in >= self.burn_in:
+                break
+            stage *= 2
+        # The burn in can also end at max_burn_in with converged chains
+        if rhat >= RHAT_THRESHOLD:
+            print(f"WARNING: The chains did not converge in {burn_in} burn-in steps (R-hat = {rhat:.3f})." + "\n" +
+                  "Continuing with the last step size.")
+
+        # The step size is frozen from here on, and the walk after burn in
+        # is timed for the effective samples per second
+        start = time.perf_counter()
+        step_size = math.exp(log_step)
+        n_post = self.sample_size - burn_in
+        n_batches = min(BATCHES_PER_CHAIN, n_post)
+        counts = np.zeros((n_batches, n_chains))
+        accepted = 0
+        i = 0
+        for n in chunk_sizes(n_post, max(1, TILE_SIZE // n_chains)):
+            with phase("draw"):
+                steps = rng.uniform(-step_size, step_size, (n, 2, n_chains))
+            with phase("test"):
+                for dx, dy in steps:
+                    accepted += int(np.count_nonzero(self._move(x, y, dx, dy)))
+                    counts[i * n_batches // n_post] += x**2 + y**2 <= 1
+                    i += 1
+
+        result = _pooled_estimate(counts, n_post)
+        wall_time = time.perf_counter() - start
+        return AdaptiveChainEstimate(*result, step_size=step_size, burn_in=burn_in,
+                                     acceptance_rate=accepted / result.samples,
+                                     iat=result.samples / result.ess,
+                                     ess_per_sec=result.ess / wall_time if wall_time > 0 else math.inf)
+
+    def _walk(self, rng, n_chains, n_batches = 1):
+        """
+        Runs n_chains independent chains from the center of the square, and
+        returns the number of steps after burn in each spent inside the circle,
+        as an array of shape (n_batches, n_chains). The steps after burn in
+        are split in n_batches consecutive batches of (nearly) equal length.
+        The steps are drawn in tiles of at most TILE_SIZE moves.
+        """
+        n_post = self.sample_size - self.burn_in
+        num_inside = np.zeros((n_batches, n_chains))
+        group = min(n_chains, TILE_SIZE)
+        tile_steps = max(1, TILE_SIZE // group)
+
+        for start in range(0, n_chains, group):
+            stop = min(start + group, n_chains)
+            x = np.zeros(stop - start)
+            y = np.zeros(stop - start)
+            i = 0
+            for n in chunk_sizes(self.sample_size, tile_steps):
+                with phase("draw"):
+                    steps = rng.uniform(-self.step_size, self.step_size, (n, 2, stop - start))
+                # The moves, their acceptance and the count of the steps
+                # inside the circle are interleaved, so they are timed together
+                with phase("test"):
+                    for dx, dy in steps:
+                        self._move(x, y, dx, dy)
+
+                        if i >= self.burn_in:
+                            batch = (i - self.burn_in) * n_batches // n_post
+                            num_inside[batch, start:stop] += x**2 + y**2 <= 1
+                        i += 1
+
+        return num_inside
+
+    def _move(self, x, y, dx, dy):
+        """
+        Moves the chains at (x, y) by (dx, dy) in place, where the move stays
+        in the square, and returns the mask of the accepted moves.
+        """
+        proposal_x = x + dx
+        proposal_y = y + dy
+
+        # only accept the move if it is inside the square
+        accept = (np.abs(proposal_x) <= 1) & (np.abs(proposal_y) <= 1)
+        np.copyto(x, proposal_x, where=accept)
+        np.copyto(y, proposal_y, where=accept)
+        return accept
+
+    def sweep(self, checkpoints):
+        """
+        Returns the estimate after each (increasing) number of steps after
+        burn in of checkpoints, from a single walk, or from n_chains walks
+        advanced together. The standard error comes from online batch means
+        of the fraction of the chains inside the circle at each step, which
+        keep a bounded number of batches however long the walk.
+
+        Returns:
+            list: A ChainEstimate for each checkpoint.
+        """
+        if self.adaptive:
+            raise ValueError("adaptive is not avaliable with sweep.")
+        stats = BatchMeans()
+        steps = self._steps()
+        results = []
+        for checkpoint in checkpoints:
+            for value in islice(steps, checkpoint - stats.count):
+                stats.add(value)
+            results.append(self._batch_estimate(stats))
+        return results
+
+    def _batch_estimate(self, stats):
+        """
+        Returns the ChainEstimate of the walk after burn in, from the
+        BatchMeans of the fraction of the chains inside the circle at each
+        step yielded by _steps().
+        """
+        n_chains = self.n_chains or 1
+        p = stats.mean
+        samples = stats.count * n_chains
+        asymptotic_var = stats.asymptotic_variance()
+        se = 4 * math.sqrt(asymptotic_var / stats.count)
+        # The series is the mean of n_chains chains, each with variance p(1 - p)
+        ess = samples * p * (1 - p) / (n_chains * asymptotic_var) if asymptotic_var > 0 else math.nan
+        return ChainEstimate(4 * p, se, ess, samples)
+
+    def _steps(self):
+        """
+        Walks forever, yielding at every step after burn in the fraction of
+        the chains inside the circle. A single chain walks like estimate(),
+        from the same random stream.
+        """
+        if self.n_chains is None:
+            rand = make_random(self.seed)
+            x, y = 0, 0
+            i = 0
+            while True:
+                dx = rand.uniform(-self.step_size, self.step_size)
+                dy = rand.uniform(-self.step_size, self.step_size)
+                proposal_x = x + dx
+                proposal_y = y + dy
+
+                # only accept the move if it is inside the square
+                if -1 <= proposal_x <= 1 and -1 <= proposal_y <= 1:
+                    x, y = proposal_x, proposal_y
+
+                if i >= self.burn_in:
+                    yield 1.0 if x**2 + y**2 <= 1 else 0.0
+                i += 1
+
+        rng = make_rng(self.seed)
+        x = np.zeros(self.n_chains)
+        y = np.zeros(self.n_chains)
+        tile_steps = max(1, TILE_SIZE // self.n_chains)
+        i = 0
+        while True:
+            with phase("draw"):
+                steps = rng.uniform(-self.step_size, self.step_size, (tile_steps, 2, self.n_chains))
+            for dx, dy in steps:
+                self._move(x, y, dx, dy)
+                if i >= self.burn_in:
+                    yield int(np.count_nonzero(x**2 + y**2 <= 1)) / self.n_chains
+                i += 1
+
+    def _bin_steps(self, first, xs, ys, rasters, reservoir):
+        """Bins the points visited at steps first, first + 1, ... into the rasters."""
+        if not xs:
+            return
+        xs = np.array(xs)
+        ys = np.array(ys)
+        burn = np.arange(first, first + len(xs)) < self.burn_in
+        inside = ~burn & (xs**2 + ys**2 <= 1)
+        outside = ~burn & ~inside
+
+        rasters["burn"].add(xs[burn], ys[burn])
+        rasters["inside"].add(xs[inside], ys[inside])
+        rasters["outside"].add(xs[outside], ys[outside])
+        # 0 for burn in, 1 inside and 2 outside the circle
+        reservoir.add(xs, ys, inside + 2 * outside)
+
+    def _viz_raster(self, pi_est, rasters, reservoir, end):
+        from matplotlib import pyplot as plt
+
+        fig, ax = plt.subplots(figsize=(6, 6))
+
+        # Plot how often each area was visited
+        rasters["burn"].show(ax, "grey", label="Burn-in")
+        rasters["inside"].show(ax, "#6FAF22", label="Inside Circle")
+        rasters["outside"].show(ax, "#7846B4", label="Outside Circle")
+
+        # Scatter a subsample of the visited points on top
+        xs, ys, kind = reservoir.columns()
+        for value, color in [(1, "#6FAF22"), (2, "#7846B4")]:
+            ax.scatter(xs[kind == value], ys[kind == value], color=color,
+                       edgecolors="white", linewidths=0.3, s=10)
+
+        square_and_circle(ax)
+
+        # Mark the start and end points
+        ax.scatter(0, 0, color='green', s=100, label="Start", edgecolors='black')
+        ax.scatter(*end, color='black', s=100, label="End", edgecolors='white')
+
+        # Labels and legend
+        fig.suptitle("Drunkard's Walk Path with {} steps, including {} burn-in steps".format(self.sample_size, self.burn_in))
+        ax.set_title(f"Estimated value of pi = {pi_est:.4f}")
+        ax.legend()
+        plt.show()
+
     def _viz(self, pi_est):
+        from matplotlib import pyplot as plt
+
         # Create the plot
         fig, ax = plt.subplots(figsize=(6, 6))
         ax.set_aspect('equal')
@@ -108,4 +461,30 @@ class Drunkard:
         fig.suptitle("Drunkard's Walk Path with {} steps, including {} burn-in steps".format(self.sample_size, self.burn_in))
         ax.set_title(f"Estimated value of pi = {pi_est:.4f}")
         ax.legend()
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+        return pi_est
+
+
+def _pooled_estimate(counts, n_post):
+    """
+    Pools chains into one ChainEstimate, given the number of steps each
+    spent inside the circle in each of its consecutive batches, of shape
+    (n_batches, n_chains), out of n_post steps after burn in.
+    """
+    n_batches, n_chains = counts.shape
+    lengths = np.bincount(np.arange(n_post) * n_batches // n_post)
+    samples = n_chains * n_post
+    p = float(counts.sum()) / samples
+
+    # The variance of the batch means, scaled by the batch length,
+    # estimates the asymptotic variance of the chain
+    batch_means = counts / lengths[:, None]
+    if batch_means.size > 1:
+        asymptotic_var = float(np.var(batch_means, ddof=1)) * n_post / n_batches
+    else:
+        asymptotic_var = math.nan
+    se = 4 * math.sqrt(asymptotic_var / samples)
+    ess = samples * p * (1 - p) / asymptotic_var if asymptotic_var > 0 else math.nan
+
+    return ChainEstimate(4 * p, se, ess, samples)
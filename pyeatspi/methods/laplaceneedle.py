@@ -1,9 +1,10 @@
-import random
 import time
-from matplotlib import pyplot as plt
 import math
+import numpy as np
+from ..sampling import (NeedleEstimator, check_backend, check_kernel, check_threads, hit_stats,
+                        make_random, random_directions, threaded_sum)
 
-class LaplaceNeedle:
+class LaplaceNeedle(NeedleEstimator):
     """
     Implements a Monte Carlo Simulation of Laplace's extension to Buffon's 
     Needle problem.
@@ -15,29 +16,52 @@ class LaplaceNeedle:
     the equation, we can conduct a simiulation to estimate pi.
 
     This is an anthetic variates method.
+
+    With kernel="vector", the needles are drawn in numpy chunks without any
+    trigonometric function: the direction of a needle is a random point
+    (gx, gy) of the unit disk, and its center is drawn directly as its
+    distances dx and dy to the nearest vertical and horizontal lines. The
+    needle crosses a vertical line when dx <= (needle_length / 2) * |gx| / |g|,
+    and likewise for the horizontal lines, which is tested squared. With
+    dtype="float32", the samples are drawn in single precision.
     """
 
-    def __init__(self, sample_size, viz):
+    def __init__(self, sample_size, viz, backend = "python", seed = None, n_threads = 1,
+                 kernel = "angle", dtype = "float64"):
+        check_backend(backend)
+        self.kernel = kernel
+        self.dtype = check_kernel(kernel, dtype)
         self.sample_size = sample_size
         self.viz = viz
+        self.backend = backend
+        self.seed = seed
+        self.n_threads = check_threads(n_threads)
         self.needle_length = 0.5
         self.v_spacing = 1.0
         self.h_spacing = 1.0
+        # RunningStats of the scores of the last estimate, for its standard error
+        self.stats = None
         self.needles = [] # for viz
 
     def estimate(self):
         if self.viz:
             print("WARNING: Visualization is not available for Laplace's Needle method." + "\n" +
                   "Continuing without visualization.")
+
+        if self.backend == "numpy" or self.n_threads > 1 or self.kernel == "vector":
+            hits = threaded_sum(self, self._make_rngs(), self.sample_size)
+            self.stats = hit_stats(hits, self.sample_size)
+            return self._pi_from_hits(hits)
         
+        rand = make_random(self.seed)
         hits = 0 
         for i in range(self.sample_size):
             # Randomly choose the midpoint (x,y) within one grid cell.
-            x = random.uniform(0, self.h_spacing)
-            y = random.uniform(0, self.v_spacing)
+            x = rand.uniform(0, self.h_spacing)
+            y = rand.uniform(0, self.v_spacing)
 
             # Randomly choose the angle phi uniformly between -pi/2 and pi/2.
-            phi = random.uniform(-math.pi/2, math.pi/2)
+            phi = rand.uniform(-math.pi/2, math.pi/2)
 
             # Calculate the projection distances along the x and y axes.
             proj_x = (self.needle_length / 2) * abs(math.cos(phi))
@@ -51,12 +75,45 @@ class LaplaceNeedle:
 
             if crosses_vertical or crosses_horizontal:
                 hits += 1
-            
+
+        self.stats = hit_stats(hits, self.sample_size)
+        return self._pi_from_hits(hits)
+
+    def _pi_from_mean(self, mean):
         # Estimate pi
-        if hits == 0:
+        if np.any(mean == 0):
             raise ValueError("No needles crossed a line. Try increasing the sample size!")
 
         pi_est = (self.needle_length * (2 * (self.v_spacing + self.h_spacing) - self.needle_length)) \
-            / (self.v_spacing * self.h_spacing * (hits / self.sample_size))
+            / (self.v_spacing * self.h_spacing * mean)
             
-        return pi_est
\ No newline at end of file
+        return pi_est
+
+    def _pi_slope(self, mean):
+        # Derivative of _pi_from_mean, for the delta method standard error
+        return -self._pi_from_mean(mean) / mean
+
+    def _draw_vector(self, rng, size):
+        dx = rng.random(size, dtype=self.dtype) * (self.v_spacing / 2)
+        dy = rng.random(size, dtype=self.dtype) * (self.h_spacing / 2)
+        return (dx, dy) + random_directions(rng, size, self.dtype)
+
+    def _score_vector(self, dx, dy, gx, norm):
+        # d <= (needle_length / 2) * |g_i| / sqrt(norm), squared
+        half_length = self.dtype.type(self.needle_length / 2)
+        gx2 = gx * gx
+        crosses_vertical = dx * dx * norm <= half_length * half_length * gx2
+        crosses_horizontal = dy * dy * norm <= half_length * half_length * (norm - gx2)
+        return crosses_vertical | crosses_horizontal
+
+    def _draw_angle(self, rng, size):
+        return (rng.uniform(0, self.h_spacing, size),
+                rng.uniform(0, self.v_spacing, size),
+                rng.uniform(-math.pi/2, math.pi/2, size))
+
+    def _score_angle(self, x, y, phi):
+        proj_x = (self.needle_length / 2) * np.abs(np.cos(phi))
+        proj_y = (self.needle_length / 2) * np.abs(np.sin(phi))
+        crosses_vertical = (x <= proj_x) | (x >= self.v_spacing - proj_x)
+        crosses_horizontal = (y <= proj_y) | (y >= self.h_spacing - proj_y)
+        return crosses_vertical | crosses_horizontal
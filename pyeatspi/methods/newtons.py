@@ -1,7 +1,13 @@
 import random
 import math
-import numpy as np
-import matplotlib.pyplot as plt
+import decimal
+from collections import namedtuple
+
+MultiStartResult = namedtuple("MultiStartResult", ["roots", "basins", "iterations"])
+
+# Extra digits carried by the high precision mode, on top of those lost by
+# the double angle formulas
+GUARD_DIGITS = 10
 
 class Newtons:
     """
@@ -9,15 +15,62 @@ class Newtons:
 
     The function uses the fact that sin(pi) = 0, so finding a 
     root of sin(x) near the initial guess will give an approximation of pi.
+
+    Two more modes are avaliable:
+        - starts: An array of starting points, all iterated at once with
+        numpy. Returns a MultiStartResult with the root each start converged
+        to, its basin k (the root is k*pi) and the number of iterations.
+        Starts anywhere are accepted, and with halley=True Halley's method
+        is used instead of Newton's.
+        - precision: The number of decimal places of a high precision run,
+        which refines the float root reached from inital_guess with decimal
+        arithmetic. Near pi, x - tan(x) has an error of about
+        -e**3/3 for an error e, so every iteration triples the number of
+        correct digits, and is run at just the precision it can reach.
+        sin and cos are computed with their Taylor series after halving the
+        argument, followed by the double angle formulas.
+
+    seed is accepted like for the other methods, but unused, as the method
+    is deterministic.
     """
 
-    def __init__(self, sample_size, viz, inital_guess = 2.0, tolerance = 1e-6):
+    def __init__(self, sample_size, viz, inital_guess = 2.0, tolerance = 1e-6,
+                 starts = None, halley = False, precision = None, seed = None):
         self.sample_size = sample_size
         self.viz = viz
+        self.seed = seed
         self.inital_guess = inital_guess
         self.tolerance = tolerance
+        self.starts = starts
+        self.halley = halley
+        self.precision = precision
 
     def estimate(self):
+        if self.starts is not None and self.precision is not None:
+            raise ValueError("starts and precision cannot be combined.")
+        if self.starts is not None or self.precision is not None:
+            if self.viz:
+                print("WARNING: Visualization is not available for multi-start or high precision" + "\n" +
+                      "Newton's method. Continuing without visualization.")
+            if self.starts is not None:
+                return self.estimate_starts()
+            return self.estimate_precise()
+
+        x, iterations = self._iterate()
+        
+        if self.viz:
+            return self._viz(x, iterations)
+        else:
+            return x
+
+    def _iterate(self):
+        """
+        Runs Newton's method in floats from inital_guess, for at most
+        sample_size iterations or until |sin(x)| < tolerance.
+
+        Returns:
+            tuple: The last iterate, and the list of all the iterates.
+        """
         if self.inital_guess >= 6*math.pi or self.inital_guess <= math.pi/2:
             raise ValueError("Initial guess must be between pi/2 and 6*pi.")
 
@@ -32,13 +85,86 @@ class Newtons:
 
             x = x - fx / dfx
             iterations.append(x)
+        return x, iterations
         
-        if self.viz:
-            return self._viz(x, iterations)
-        else:
-            return x
-        
+    def estimate_starts(self):
+        """
+        Iterates all the starting points at once, for at most sample_size
+        iterations each. Points stop as soon as |sin(x)| < tolerance.
+
+        Returns:
+            MultiStartResult: The roots, basins and iteration counts, shaped
+            like starts. Starts which did not converge have a NaN root and
+            basin.
+        """
+        import numpy as np
+
+        starts = np.asarray(self.starts, dtype=float)
+        x = starts.ravel().copy()
+        iterations = np.zeros(x.size, dtype=int)
+        active = np.arange(x.size)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for _ in range(self.sample_size):
+                s = np.sin(x[active])
+                running = ~(np.abs(s) < self.tolerance)
+                active, s = active[running], s[running]
+                if active.size == 0:
+                    break
+                c = np.cos(x[active])
+                if self.halley:
+                    # Halley's step for sin: 2 f f' / (2 f'^2 - f f'') with f'' = -sin
+                    x[active] -= 2 * s * c / (2 * c * c + s * s)
+                else:
+                    x[active] -= s / c
+                iterations[active] += 1
+
+            converged = np.abs(np.sin(x)) < self.tolerance
+        roots = np.where(converged, x, np.nan)
+        basins = np.round(roots / np.pi)
+        return MultiStartResult(roots.reshape(starts.shape), basins.reshape(starts.shape),
+                                iterations.reshape(starts.shape))
+
+    def estimate_precise(self):
+        """
+        Runs Newton's method in floats from inital_guess until |sin(x)| <
+        tolerance, like estimate, then refines the root to precision decimal
+        places with decimal arithmetic. The float iterate is correct to
+        about -log10(tolerance) digits (at most 15), and each decimal
+        iteration triples that. A ValueError is raised if the float
+        iterations do not converge, or if sample_size is smaller than the
+        number of decimal iterations needed.
+
+        Returns:
+            decimal.Decimal: The root, pi for initial guesses near pi,
+            rounded to precision decimal places.
+        """
+        start, _ = self._iterate()
+        if not abs(math.sin(start)) < self.tolerance:
+            raise ValueError(f"Newton's method did not converge to the tolerance in {self.sample_size} "
+                             "iterations.")
+        start_digits = min(15, max(1, int(-math.log10(self.tolerance))))
+
+        target = self.precision + 1 + GUARD_DIGITS
+        precs = [target]
+        while precs[-1] > 3 * start_digits:
+            precs.append(precs[-1] // 3 + 2)
+        if self.sample_size < len(precs):
+            raise ValueError(f"{len(precs)} iterations are needed for {self.precision} decimal places, "
+                             f"but sample_size is {self.sample_size}.")
+
+        with decimal.localcontext() as ctx:
+            x = decimal.Decimal(start)
+            for prec in precs[::-1]:
+                ctx.prec = prec
+                sin, cos = _sin_cos(x)
+                x = x - sin / cos
+            ctx.prec = self.precision + 1
+            return +x
+
     def _viz(self, pi_est, iterations):
+        import numpy as np
+        import matplotlib.pyplot as plt
+
         # Generate a range of x values covering the area of interest
         x_vals = np.linspace(0, 4*math.pi, 4000)
         y_sin = np.sin(x_vals)
@@ -65,4 +191,39 @@ class Newtons:
         plt.title(f"Estimated value of pi = {pi_est:.4f}")        
         plt.legend()
         plt.grid(True)
-        plt.show()
\ No newline at end of file
+        plt.show()
+
+        return pi_est
+
+def _sin_cos(x):
+    """
+    Returns sin(x) and cos(x) to the precision of the current decimal
+    context. x is halved k times, so that their Taylor series only need
+    about sqrt(precision) terms, and the results are doubled back up with
+    sin(2y) = 2 sin(y) cos(y) and cos(2y) = 1 - 2 sin(y)**2.
+    """
+    with decimal.localcontext() as ctx:
+        prec = ctx.prec
+        k = int(math.sqrt(prec * math.log2(10)))
+        # Every doubling can lose a bit
+        ctx.prec = prec + int(k * math.log10(2)) + GUARD_DIGITS
+        y = x / 2**k
+        y2 = y * y
+        eps = decimal.Decimal(10) ** -ctx.prec
+
+        sin = term = y
+        n = 1
+        while abs(term) > eps:
+            term = -term * y2 / ((n + 1) * (n + 2))
+            sin += term
+            n += 2
+        cos = term = decimal.Decimal(1)
+        n = 0
+        while abs(term) > eps:
+            term = -term * y2 / ((n + 1) * (n + 2))
+            cos += term
+            n += 2
+
+        for _ in range(k):
+            sin, cos = 2 * sin * cos, 1 - 2 * sin * sin
+    return +sin, +cos
@@ -0,0 +1,116 @@
+"""
+Opt-in instrumentation of the hot paths of the estimators.
+
+    with pyeatspi.profile() as profiler:
+        pyeatspi.estimate(10**7, "circle-ratio", backend="numpy")
+    print(profiler.report())
+
+While a profiler is active (per thread or asyncio task, as it is held in a
+context variable), the vectorized paths time their phases:
+
+    draw    Drawing random numbers.
+    test    The geometric test or integrand giving the per-sample scores.
+    reduce  Summing the scores.
+
+Chudnovsky reports its split, divide and convert phases instead. The scalar
+python loops interleave the phases at every sample, so they are not broken
+down. When no profiler is active, a phase costs a context variable lookup.
+"""
+import contextlib
+import contextvars
+import threading
+import time
+from collections import namedtuple
+
+EstimateResult = namedtuple("EstimateResult", ["estimate", "se", "ci", "samples",
+                                               "wall_time", "samples_per_sec"])
+
+# An event reported while an estimate or comparison runs. kind is one of
+# "start", "progress", "warning" or "result"; value is the partial or final
+# result (the estimate of pi, or the standard deviations of compare_std).
+ProgressEvent = namedtuple("ProgressEvent", ["kind", "method", "done", "total", "value", "se", "message"],
+                           defaults=(None,) * 6)
+
+# z-score of the 95% confidence intervals
+Z_95 = 1.959963984540054
+
+_profiler = contextvars.ContextVar("pyeatspi_profiler", default=None)
+
+
+class Profiler:
+    """
+    Accumulates the time spent in, and the number of calls to, each phase.
+
+    Args:
+        callback (callable): Called with the report when the profiler exits,
+        e.g. to export the metrics.
+    """
+
+    def __init__(self, callback = None):
+        self.callback = callback
+        self.times = {}
+        self.calls = {}
+        self._token = None
+        # Threads of a threaded estimate record into the same profiler
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        self._token = _profiler.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _profiler.reset(self._token)
+        if self.callback is not None:
+            self.callback(self.report())
+        return False
+
+    def add(self, name, seconds):
+        """Records one call of a phase taking seconds."""
+        with self._lock:
+            self.times[name] = self.times.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def report(self):
+        """
+        Returns:
+            dict: For each phase, the total seconds, the number of calls and
+            the fraction of the profiled time.
+        """
+        total = sum(self.times.values())
+        return {name: {"seconds": seconds, "calls": self.calls[name],
+                       "fraction": seconds / total if total > 0 else 0.0}
+                for name, seconds in self.times.items()}
+
+
+def profile(callback = None):
+    """Returns a Profiler, to be used as a context manager around estimates."""
+    return Profiler(callback)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """Times the enclosed block as phase name, if a profiler is active."""
+    profiler = _profiler.get()
+    if profiler is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add(name, time.perf_counter() - start)
+
+
+def make_result(value, sample_size, wall_time, se = None):
+    """
+    Builds the EstimateResult of an estimate. value may be a number, or a
+    SequentialEstimate or ChainEstimate, whose standard error and sample
+    count are used.
+    """
+    if hasattr(value, "se"):
+        value, se, samples = value.estimate, value.se, value.samples
+    else:
+        samples = sample_size
+    ci = (value - Z_95 * se, value + Z_95 * se) if se is not None else None
+    samples_per_sec = samples / wall_time if wall_time > 0 else float("inf")
+    return EstimateResult(value, se, ci, samples, wall_time, samples_per_sec)
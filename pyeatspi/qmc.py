@@ -0,0 +1,195 @@
+"""
+Scrambled low-discrepancy (quasi-Monte Carlo) point sets for the
+sampler="sobol" and sampler="halton" options.
+
+A quasi-random sequence covers the unit square far more evenly than
+independent uniforms, so for smooth low-dimensional integrands the error of
+an average over n points shrinks close to O(1/n) instead of O(1/sqrt(n)).
+
+Both sequences are randomized (scrambled) from a seed. Every point is still
+uniformly distributed, so estimates stay unbiased, and independently
+scrambled copies of a sequence give independent replicates whose spread is
+a valid error estimate (randomized QMC). The points are generated in
+vectorized blocks, and an engine carries on where its last block stopped.
+"""
+import numpy as np
+from .sampling import chunked_sum, make_rng, seed_sequence
+
+SAMPLERS = ("random", "sobol", "halton")
+
+# Number of bits of the Sobol points, which are exactly representable as
+# doubles. This also bounds the length of the sequence to 2**SOBOL_BITS.
+SOBOL_BITS = 52
+
+# Bases of the Halton dimensions
+HALTON_BASES = (2, 3)
+
+
+def check_sampler(sampler):
+    """Raise a ValueError if the sampler is not supported."""
+    if sampler not in SAMPLERS:
+        raise ValueError(f"Invalid sampler. Must be one of {list(SAMPLERS)}.")
+
+
+def make_engine(sampler, seed, dim):
+    """Returns a scrambled engine of dim dimensions for a quasi-random sampler."""
+    if sampler == "sobol":
+        return Sobol(dim, seed)
+    if sampler == "halton":
+        return Halton(dim, seed)
+    raise ValueError(f"{sampler} is not a quasi-random sampler.")
+
+
+class Sobol:
+    """
+    The Sobol sequence in up to 2 dimensions, scrambled with a random linear
+    matrix scramble and a digital shift.
+
+    Point i is the XOR of the direction numbers selected by the bits of the
+    Gray code of i. The first dimension is the van der Corput sequence, and
+    the second one comes from the primitive polynomial x + 1. Scrambling
+    multiplies the digits of the direction numbers by a random lower
+    triangular binary matrix with a unit diagonal, then XORs the points with
+    a random shift, which keeps the sequence a (t, s)-sequence.
+
+    Args:
+        dim (int): The number of dimensions, 1 or 2.
+        seed: Seeds the scramble, like the seed of make_rng.
+        scramble (bool): Whether to scramble the points. The unscrambled
+        sequence starts with the point 0.
+    """
+
+    def __init__(self, dim, seed = None, scramble = True):
+        if not 1 <= dim <= 2:
+            raise ValueError("Sobol points are only avaliable in 1 or 2 dimensions.")
+        self.dim = dim
+        self.index = 0
+
+        rng = make_rng(seed)
+        bits = SOBOL_BITS
+        digits = np.arange(bits, dtype=np.uint64)
+        m = 1
+        directions = np.zeros((dim, bits), dtype=np.uint64)
+        for k in range(bits):
+            directions[0, k] = 1 << (bits - 1 - k)
+            if dim > 1:
+                directions[1, k] = m << (bits - 1 - k)
+                m = (m << 1) ^ m
+
+        self.shift = np.zeros(dim, dtype=np.uint64)
+        if scramble:
+            for d in range(dim):
+                # Digit j of a direction number is its (j+1)-th bit from the top
+                v = (directions[d][None, :] >> (np.uint64(bits - 1) - digits)[:, None]) & np.uint64(1)
+                matrix = np.tril(rng.integers(0, 2, (bits, bits)), -1) + np.eye(bits, dtype=int)
+                scrambled = (matrix @ v.astype(int)) % 2
+                directions[d] = np.sum(scrambled.astype(np.uint64) << (np.uint64(bits - 1) - digits)[:, None],
+                                       axis=0, dtype=np.uint64)
+            self.shift = rng.integers(0, 2**bits, dim, dtype=np.uint64)
+        self.directions = directions
+
+    def random(self, n):
+        """Returns the next n points, as an array of shape (dim, n) in [0, 1)."""
+        if self.index + n > 2**SOBOL_BITS:
+            raise ValueError(f"Sobol sequences are limited to 2**{SOBOL_BITS} points.")
+        index = np.arange(self.index, self.index + n, dtype=np.uint64)
+        gray = index ^ (index >> np.uint64(1))
+        points = np.broadcast_to(self.shift[:, None], (self.dim, n)).copy()
+        for k in range(int(self.index + n).bit_length()):
+            bit = (gray >> np.uint64(k)) & np.uint64(1)
+            points ^= bit * self.directions[:, k, None]
+        self.index += n
+        return points * 2.0**-SOBOL_BITS
+
+
+class Halton:
+    """
+    The Halton sequence in up to 2 dimensions, scrambled with random digit
+    permutations.
+
+    Coordinate d of point i is the radical inverse of i in base
+    HALTON_BASES[d], with every digit position getting its own random
+    permutation of the digits. The permutations are applied to the leading
+    zeros too, down to the precision of a double, so that the scrambled
+    points are uniformly distributed.
+
+    Args:
+        dim (int): The number of dimensions, 1 or 2.
+        seed: Seeds the scramble, like the seed of make_rng.
+        scramble (bool): Whether to scramble the points. The unscrambled
+        sequence starts with the point 0.
+    """
+
+    def __init__(self, dim, seed = None, scramble = True):
+        if not 1 <= dim <= len(HALTON_BASES):
+            raise ValueError(f"Halton points are only avaliable in 1 to {len(HALTON_BASES)} dimensions.")
+        self.dim = dim
+        self.index = 0
+
+        rng = make_rng(seed)
+        self.permutations = []
+        self.tails = []
+        for base in HALTON_BASES[:dim]:
+            n_digits = int(np.ceil(53 / np.log2(base)))
+            if scramble:
+                permutation = rng.random((n_digits, base)).argsort(axis=1)
+            else:
+                permutation = np.tile(np.arange(base), (n_digits, 1))
+            self.permutations.append(permutation)
+            # Contribution of the permuted zero digits past digit d, for the
+            # digit positions that none of the indices reach
+            scale = float(base) ** -np.arange(1, n_digits + 1)
+            zeros = permutation[:, 0] * scale
+            self.tails.append(np.append(np.cumsum(zeros[::-1])[::-1], 0.0))
+
+    def random(self, n):
+        """Returns the next n points, as an array of shape (dim, n) in [0, 1)."""
+        index = np.arange(self.index, self.index + n, dtype=np.int64)
+        points = np.empty((self.dim, n))
+        for d, base in enumerate(HALTON_BASES[:self.dim]):
+            permutation = self.permutations[d]
+            q = index.copy()
+            x = np.zeros(n)
+            scale = 1.0
+            digit = 0
+            while digit < len(permutation) and base**digit <= self.index + n - 1:
+                scale /= base
+                x += permutation[digit][q % base] * scale
+                q //= base
+                digit += 1
+            points[d] = x + self.tails[d][digit]
+        self.index += n
+        # The sum of the digits can round up to 1
+        return np.minimum(points, 1 - 2.0**-53)
+
+
+def thread_engines(sampler, seed, dim, sizes):
+    """
+    Returns one engine per thread, all with the same scramble, positioned at
+    consecutive offsets so that thread i draws the next sizes[i] points. The
+    threads together draw the same points as a single engine would.
+    """
+    seed = seed_sequence(seed)
+    engines = []
+    offset = 0
+    for n in sizes:
+        engine = make_engine(sampler, seed, dim)
+        engine.index = offset
+        engines.append(engine)
+        offset += n
+    return engines
+
+
+def rqmc_sums(estimator, sampler, seed, n_replicates, total, dim):
+    """
+    Sum the per-sample scores of an estimator for n_replicates independently
+    scrambled copies of a quasi-random sequence of total points each. The
+    sums are independent, so their spread measures the error of the
+    randomized QMC estimate.
+
+    Returns:
+        numpy.ndarray: The sum of the scores of each replicate.
+    """
+    root = seed_sequence(seed)
+    return np.array([chunked_sum(estimator, make_engine(sampler, child, dim), total)
+                     for child in root.spawn(n_replicates)])
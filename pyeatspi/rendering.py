@@ -0,0 +1,107 @@
+"""
+Bounded-memory rendering for visualizing large runs with viz="raster".
+
+Instead of keeping every sample for matplotlib, samples are streamed into
+fixed-resolution 2-D histograms, plus a small uniform random subsample
+(reservoir) which is drawn on top. Memory is O(pixels + reservoir size)
+whatever the number of samples.
+
+matplotlib is only imported when drawing, to keep it out of headless runs.
+"""
+import numpy as np
+
+# Resolution of the density rasters, in bins per axis
+RASTER_BINS = 300
+
+# Number of samples kept to draw on top of the rasters
+RESERVOIR_SIZE = 1000
+
+# Number of points buffered by scalar loops before they are binned
+BUFFER_SIZE = 100_000
+
+
+class DensityRaster:
+    """
+    A fixed-resolution 2-D histogram of points, streamed in chunks.
+
+    Args:
+        extent (tuple): The (xmin, xmax, ymin, ymax) area covered by the raster.
+        bins (int): The number of bins along each axis.
+    """
+
+    def __init__(self, extent, bins = RASTER_BINS):
+        self.extent = extent
+        self.bins = bins
+        self.counts = np.zeros((bins, bins))
+
+    def add(self, x, y):
+        """Adds arrays of points to the histogram."""
+        counts, _, _ = np.histogram2d(x, y, bins=self.bins,
+                                      range=[self.extent[:2], self.extent[2:]])
+        self.counts += counts
+
+    def show(self, ax, color, label = None):
+        """Draws the density on ax, fading from transparent to color."""
+        from matplotlib.colors import LinearSegmentedColormap
+
+        cmap = LinearSegmentedColormap.from_list("density", [(1, 1, 1, 0), color])
+        density = np.ma.masked_equal(self.counts.T, 0)
+        ax.imshow(density, origin="lower", extent=self.extent, cmap=cmap, vmin=0,
+                  interpolation="nearest", aspect="auto")
+        if label is not None:
+            # imshow has no legend entry, so add an empty proxy
+            ax.scatter([], [], color=color, marker="s", label=label)
+
+
+class Reservoir:
+    """
+    A uniform random subsample of at most size rows of a stream of samples.
+    Every sample gets a random key, and the samples with the smallest keys
+    are kept, so each chunk is merged with a single partition.
+
+    Args:
+        size (int): The maximum number of samples kept.
+        rng (numpy.random.Generator): The generator for the keys.
+    """
+
+    def __init__(self, size = RESERVOIR_SIZE, rng = None):
+        self.size = size
+        self.rng = np.random.default_rng(rng)
+        self.keys = np.empty(0)
+        self.rows = None
+
+    def add(self, *columns):
+        """Offers a chunk of samples, given as one array per column."""
+        rows = np.column_stack(columns)
+        keys = self.rng.random(len(rows))
+        if self.rows is not None:
+            # Only samples beating the current largest key can get in
+            if len(self.keys) >= self.size:
+                keep = keys < self.keys.max()
+                rows, keys = rows[keep], keys[keep]
+            rows = np.concatenate([self.rows, rows])
+            keys = np.concatenate([self.keys, keys])
+        if len(keys) > self.size:
+            smallest = np.argpartition(keys, self.size)[:self.size]
+            rows, keys = rows[smallest], keys[smallest]
+        self.rows, self.keys = rows, keys
+
+    def columns(self):
+        """Returns the kept samples, as one array per column."""
+        if self.rows is None:
+            return ()
+        return tuple(self.rows.T)
+
+
+def square_and_circle(ax):
+    """Draws the unit circle inside the [-1, 1] x [-1, 1] square on ax."""
+    from matplotlib import pyplot as plt
+
+    circle = plt.Circle((0, 0), 1, color="black", fill=False, linewidth=2)
+    ax.add_artist(circle)
+    ax.plot([-1, 1, 1, -1, -1], [-1, -1, 1, 1, -1], 'k-', linewidth=2)
+    ax.set_xticks(np.arange(-1, 1.1, 0.5))
+    ax.set_yticks(np.arange(-1, 1.1, 0.5))
+    ax.set_aspect('equal', 'box')
+    ax.set_xlim(-1.1, 1.1)
+    ax.set_ylim(-1.1, 1.1)
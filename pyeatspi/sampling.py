@@ -0,0 +1,560 @@
+"""
+Helpers shared by the vectorized (numpy) backend of the Monte Carlo methods.
+
+A method supporting the numpy backend provides two hooks:
+
+    _draw(rng, size)  -> tuple of arrays of raw random draws
+    _score(*draws)    -> array with one value per sample (hit indicator or
+                         integrand value)
+
+Samples are drawn in fixed-size chunks so memory stays bounded no matter how
+large the requested sample size is.
+"""
+import math
+import os
+import random
+from collections import namedtuple
+import numpy as np
+from .checkpoint import CHECKPOINT_SAMPLES, accumulate
+from .profiling import phase
+
+BACKENDS = ("python", "numpy")
+
+# Needle kernels: "angle" draws the angle of the needle and takes its sine
+# and cosine, "vector" draws its direction as a random vector.
+KERNELS = ("angle", "vector")
+
+# Candidate points drawn per direction by random_directions. A point of the
+# square falls in the inscribed disk with probability ~0.785, so this leaves
+# a margin of a few percent, and a second round of draws is rarely needed.
+DIRECTION_OVERSAMPLING = 1.3
+
+# Number of samples drawn per chunk.
+CHUNK_SIZE = 1_000_000
+
+# Maximum number of samples held in memory by a (replicates, samples) tile.
+TILE_SIZE = CHUNK_SIZE
+
+# Number of batches kept by the online batch means of a sweep, which holds
+# between this number and twice as many complete batches.
+SWEEP_BATCHES = 32
+
+# Size of the first batch of a sequential estimate, used as a pilot to
+# estimate the variance of the scores.
+PILOT_SIZE = 10_000
+
+SequentialEstimate = namedtuple("SequentialEstimate", ["estimate", "se", "samples"])
+
+ChainEstimate = namedtuple("ChainEstimate", ["estimate", "se", "ess", "samples"])
+
+# A ChainEstimate of the adaptive drunkard's walk, with the tuned step size,
+# the detected burn in, and the acceptance rate, integrated autocorrelation
+# time and effective samples per second of the walk after burn in.
+AdaptiveChainEstimate = namedtuple("AdaptiveChainEstimate",
+                                   ChainEstimate._fields + ("step_size", "burn_in", "acceptance_rate",
+                                                            "iat", "ess_per_sec"))
+
+
+def check_backend(backend):
+    """Raise a ValueError if the backend is not supported."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Invalid backend. Must be one of {list(BACKENDS)}.")
+
+
+def check_kernel(kernel, dtype):
+    """
+    Raise a ValueError if the needle kernel or its dtype is not supported.
+
+    Returns:
+        numpy.dtype: The dtype of the samples of the kernel.
+    """
+    if kernel not in KERNELS:
+        raise ValueError(f"Invalid kernel. Must be one of {list(KERNELS)}.")
+    dtype = np.dtype(dtype)
+    if dtype not in (np.float32, np.float64):
+        raise ValueError("dtype must be float32 or float64.")
+    if kernel == "angle" and dtype != np.float64:
+        raise ValueError("float32 samples are only avaliable with kernel=\"vector\".")
+    return dtype
+
+
+def random_directions(rng, size, dtype=np.float64):
+    """
+    Returns the x component gx of size random directions (gx, gy), uniform
+    over the circle, and their squared norm gx**2 + gy**2. The points are
+    drawn uniformly in the square [-1, 1]**2 and rejected outside the unit
+    disk (and at its center), which leaves them isotropic. Comparisons
+    against the norm can then be squared, with no trigonometric function.
+    """
+    shape = (size,) if np.isscalar(size) else tuple(size)
+    total = math.prod(shape)
+    gxs, norms = [], []
+    needed = total
+    while needed > 0:
+        points = rng.random((2, int(needed * DIRECTION_OVERSAMPLING) + 16), dtype=dtype)
+        points *= 2
+        points -= 1
+        norm = points[0] * points[0]
+        norm += points[1] * points[1]
+        keep = np.flatnonzero((norm <= 1) & (norm > 0))[:needed]
+        gxs.append(points[0, keep])
+        norms.append(norm[keep])
+        needed -= keep.size
+    if len(gxs) > 1:
+        gxs, norms = [np.concatenate(gxs)], [np.concatenate(norms)]
+    return gxs[0].reshape(shape), norms[0].reshape(shape)
+
+
+def check_threads(n_threads):
+    """Returns the number of threads to use, -1 meaning all CPUs."""
+    if n_threads == -1:
+        return os.cpu_count()
+    if n_threads < 1:
+        raise ValueError("n_threads must be a positive integer, or -1 for all CPUs.")
+    return n_threads
+
+
+def make_random(seed):
+    """
+    Returns a random.Random seeded with seed for the python backend. seed may
+    be an int, a numpy SeedSequence or Generator, or a random.Random which is
+    used as is. If seed is None, a generator is seeded with fresh entropy
+    from the OS, so that concurrent estimates never share a random state.
+    """
+    if isinstance(seed, random.Random):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        seed = int(seed.integers(2**63))
+    if isinstance(seed, np.random.SeedSequence):
+        seed = int.from_bytes(seed.generate_state(4).tobytes(), "little")
+    return random.Random(seed)
+
+
+def make_rng(seed):
+    """
+    Returns a numpy Generator seeded with seed for the numpy backend. A numpy
+    Generator passed as seed is used as is, and a seed is drawn from a
+    random.Random.
+    """
+    if isinstance(seed, random.Random):
+        seed = seed.getrandbits(128)
+    return np.random.default_rng(seed)
+
+
+def seed_sequence(seed):
+    """
+    Returns seed as a numpy SeedSequence, to spawn independent streams from.
+    A seed is drawn from a numpy Generator or random.Random passed as seed.
+    """
+    if isinstance(seed, np.random.SeedSequence):
+        return seed
+    if isinstance(seed, np.random.Generator):
+        return np.random.SeedSequence(int(seed.integers(2**63)))
+    if isinstance(seed, random.Random):
+        return np.random.SeedSequence(seed.getrandbits(128))
+    return np.random.SeedSequence(seed)
+
+
+def split_sizes(total, n):
+    """Splits total into n nearly equal sizes."""
+    return [total * (i + 1) // n - total * i // n for i in range(n)]
+
+
+def thread_rngs(seed, n_threads):
+    """
+    Returns one numpy Generator per thread, with independent PCG64 streams
+    spawned from seed. A single thread uses seed directly, so its results
+    are the same as without threads.
+    """
+    if n_threads == 1:
+        return [make_rng(seed)]
+    return [make_rng(child) for child in seed_sequence(seed).spawn(n_threads)]
+
+
+def chunk_sizes(total, chunk_size=CHUNK_SIZE):
+    """Yield chunk sizes of at most chunk_size which add up to total."""
+    while total > 0:
+        n = min(chunk_size, total)
+        yield n
+        total -= n
+
+
+def chunked_sum(estimator, rng, total, chunk_size=CHUNK_SIZE, stats=None):
+    """
+    Sum the per-sample scores of an estimator over total samples.
+
+    Args:
+        estimator: An estimator implementing the _draw and _score hooks.
+        rng (numpy.random.Generator): The generator to draw samples from.
+        total (int): The number of samples to draw.
+        chunk_size (int): The maximum number of samples held in memory.
+        stats (RunningStats): If given, the scores are also added to it.
+
+    Returns:
+        float: The sum of the scores of all samples.
+    """
+    total_sum = 0.0
+    for n in chunk_sizes(total, chunk_size):
+        scores = _scores(estimator, rng, n)
+        with phase("reduce"):
+            total_sum += float(np.sum(scores))
+            if stats is not None:
+                stats.update(scores)
+    return total_sum
+
+
+def threaded_sum(estimator, rngs, total, chunk_size=CHUNK_SIZE, stats=None):
+    """
+    Sum the per-sample scores of an estimator over total samples, split
+    across one thread per generator of rngs. numpy releases the GIL while
+    drawing and scoring, so the threads run on separate cores. The partial
+    sums (and the RunningStats of each thread, if stats is given) are merged
+    in thread order, so the result only depends on the generators and not
+    on the scheduling of the threads.
+
+    Returns:
+        float: The sum of the scores of all samples.
+    """
+    if len(rngs) == 1:
+        return chunked_sum(estimator, rngs[0], total, chunk_size, stats)
+
+    import contextvars
+    from concurrent.futures import ThreadPoolExecutor
+
+    thread_stats = [RunningStats() if stats is not None else None for _ in rngs]
+    with ThreadPoolExecutor(max_workers=len(rngs)) as pool:
+        # Every thread runs in a copy of the caller's context, so an active
+        # profiler sees the phases of all threads
+        futures = [pool.submit(contextvars.copy_context().run, chunked_sum, estimator, rng, n, chunk_size,
+                               partial)
+                   for rng, n, partial in zip(rngs, split_sizes(total, len(rngs)), thread_stats)]
+        total_sum = sum(future.result() for future in futures)
+    if stats is not None:
+        for partial in thread_stats:
+            stats.merge(partial)
+    return total_sum
+
+
+def hit_stats(hits, total):
+    """Returns the RunningStats of total 0/1 scores, hits of which are 1."""
+    # The scores are their own squares
+    return RunningStats.from_sums(total, hits, hits)
+
+
+def standard_error(estimator, stats):
+    """The standard error of the estimate of pi of an estimator, from the RunningStats of its scores."""
+    return abs(estimator._pi_slope(stats.mean)) * stats.standard_error()
+
+
+def tiled_sums(estimator, rng, n_replicates, total, tile_size=TILE_SIZE):
+    """
+    Sum the per-sample scores of an estimator for n_replicates independent
+    replicates of total samples each. The samples are drawn in tiles of
+    shape (replicates, samples) holding at most tile_size samples.
+
+    Returns:
+        numpy.ndarray: The sum of the scores of each replicate.
+    """
+    sums = np.zeros(n_replicates)
+    cols = max(1, min(total, tile_size))
+    rows = max(1, tile_size // cols)
+    for start in range(0, n_replicates, rows):
+        stop = min(start + rows, n_replicates)
+        for n in chunk_sizes(total, cols):
+            scores = _scores(estimator, rng, (stop - start, n))
+            with phase("reduce"):
+                sums[start:stop] += np.sum(scores, axis=1)
+    return sums
+
+
+def _scores(estimator, rng, size):
+    """Draws samples of the given size and returns their scores, timing both phases."""
+    with phase("draw"):
+        draws = estimator._draw(rng, size)
+    with phase("test"):
+        return estimator._score(*draws)
+
+
+class RunningStats:
+    """
+    Running count, mean and sum of squared deviations of the per-sample
+    scores. Batches are merged with the pairwise update of Chan et al., which
+    is numerically stable for any number of samples.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    @classmethod
+    def from_sums(cls, count, total, squares):
+        """Returns the RunningStats of count scores, given their sum and sum of squares."""
+        stats = cls()
+        if count > 0:
+            mean = total / count
+            stats._combine(count, mean, max(0.0, squares - total * mean))
+        return stats
+
+    def update(self, values):
+        """Adds a batch of scores."""
+        n = len(values)
+        if n == 0:
+            return
+        batch_mean = float(np.mean(values))
+        self._combine(n, batch_mean, float(np.sum((values - batch_mean)**2)))
+
+    def merge(self, other):
+        """Adds the scores summarized by another RunningStats."""
+        if other.count > 0:
+            self._combine(other.count, other.mean, other.m2)
+
+    def _combine(self, n, mean, m2):
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta**2 * self.count * n / total
+        self.count = total
+
+    @property
+    def variance(self):
+        """The sample variance of the scores."""
+        return self.m2 / (self.count - 1) if self.count > 1 else math.inf
+
+    def standard_error(self):
+        """The standard error of the mean score."""
+        return math.sqrt(self.variance / self.count) if self.count > 1 else math.inf
+
+
+class BatchMeans:
+    """
+    Online batch means of a stationary (autocorrelated) series, in bounded
+    memory. The series is cut into consecutive batches of batch_size values;
+    once there are 2 * n_batches complete batches, adjacent ones are merged
+    and the batch size doubles, so any prefix of the series is covered by
+    between n_batches and 2 * n_batches batches.
+    """
+
+    def __init__(self, n_batches = SWEEP_BATCHES):
+        self.n_batches = n_batches
+        self.batch_size = 1
+        self.sums = []
+        self.count = 0
+        self.total = 0.0
+        self._partial = 0.0
+
+    def add(self, value):
+        """Adds the next value of the series."""
+        self.count += 1
+        self.total += value
+        self._partial += value
+        if self.count % self.batch_size == 0:
+            self.sums.append(self._partial)
+            self._partial = 0.0
+            if len(self.sums) == 2 * self.n_batches:
+                self.sums = [a + b for a, b in zip(self.sums[::2], self.sums[1::2])]
+                self.batch_size *= 2
+
+    @property
+    def mean(self):
+        return self.total / self.count
+
+    def asymptotic_variance(self):
+        """
+        The batch size times the variance of the complete batch means, which
+        estimates the variance of the series mean times its length.
+        """
+        k = len(self.sums)
+        if k < 2:
+            return math.nan
+        means = [s / self.batch_size for s in self.sums]
+        center = sum(means) / k
+        return self.batch_size * sum((m - center)**2 for m in means) / (k - 1)
+
+
+def split_rhat(sums, squares, lengths):
+    """
+    Returns the largest split R-hat of Gelman and Rubin over the statistics
+    of a set of chains, each split in two halves which are compared as
+    separate chains. Values near 1 mean the chains have forgotten their
+    starting points and mix over the same distribution.
+
+    Args:
+        sums (numpy.ndarray): The sum of each statistic over each half of
+        each chain, of shape (2, n_statistics, n_chains).
+        squares (numpy.ndarray): The sums of the squares of the statistics,
+        of the same shape.
+        lengths (tuple): The number of steps of the two halves.
+    """
+    n = np.asarray(lengths, dtype=float)[:, None, None]
+    means = sums / n
+    variances = (squares - n * means**2) / (n - 1)
+    n = float(n.mean())
+
+    # The halves of all chains, as 2 * n_chains chains of each statistic
+    means = means.transpose(1, 0, 2).reshape(means.shape[1], -1)
+    within = variances.transpose(1, 0, 2).reshape(means.shape[0], -1).mean(axis=1)
+    between = n * means.var(axis=1, ddof=1)
+    pooled = (n - 1) / n * within + between / n
+    if np.any(within <= 0):
+        # A statistic which has not moved within a chain yet
+        return math.inf
+    return float(np.sqrt(pooled / within).max())
+
+
+def sweep_estimates(estimator, rng, checkpoints):
+    """
+    Draws one stream of samples, and records the estimate of pi and its
+    standard error when the stream reaches each sample size of checkpoints,
+    which must be increasing. The estimator must implement the same hooks
+    as for sequential_estimate.
+
+    Returns:
+        list: A SequentialEstimate for each checkpoint.
+    """
+    stats = RunningStats()
+    results = []
+    for checkpoint in checkpoints:
+        for n in chunk_sizes(checkpoint - stats.count):
+            scores = _scores(estimator, rng, n)
+            with phase("reduce"):
+                stats.update(scores)
+        # The estimate comes first, as it raises the method's error when the
+        # mean score is 0, where the standard error is undefined
+        estimate = estimator._pi_from_mean(stats.mean)
+        results.append(SequentialEstimate(estimate, standard_error(estimator, stats), stats.count))
+    return results
+
+
+def sequential_estimate(estimator, rngs, target_se, max_samples):
+    """
+    Draws batches of samples until the standard error of the estimate of pi
+    reaches target_se, or max_samples samples have been drawn. Every batch
+    is split across one thread per generator of rngs like threaded_sum, and
+    the RunningStats of the threads are merged in thread order.
+
+    The estimator must implement the _draw and _score hooks, and the
+    _pi_from_mean and _pi_slope hooks mapping the mean score to pi and its
+    derivative. The standard error of pi is obtained from the standard error
+    of the mean score with the delta method.
+
+    Args:
+        estimator: The estimator to draw samples from.
+        rngs (list): The numpy Generator of each thread.
+        target_se (float): The standard error to stop at.
+        max_samples (int): The budget of samples.
+
+    Returns:
+        SequentialEstimate: The estimate of pi, its standard error and the
+        number of samples used.
+    """
+    stats = RunningStats()
+    se = math.inf
+    batch = min(PILOT_SIZE, max_samples)
+    while batch > 0:
+        threaded_sum(estimator, rngs, batch, stats=stats)
+        if stats.mean > 0:
+            se = standard_error(estimator, stats)
+        if se <= target_se:
+            break
+
+        # Plan the next batch from the current variance estimate, growing at
+        # most geometrically in case the variance is underestimated.
+        if target_se > 0 and math.isfinite(se):
+            needed = stats.count * (se / target_se)**2
+        else:
+            needed = 2 * stats.count
+        batch = int(min(needed - stats.count + 1, stats.count, CHUNK_SIZE,
+                        max_samples - stats.count))
+
+    return SequentialEstimate(estimator._pi_from_mean(stats.mean), se, stats.count)
+
+
+class SampledEstimator:
+    """
+    The methods shared by the estimators with the _draw, _score,
+    _pi_from_mean and _pi_slope hooks: estimate_many, and the estimate_until
+    (target_se), estimate_state and sweep methods. The latter need
+    independent scores, which _check_independent checks for.
+
+    An estimator draws its points from a quasi-random engine of dim
+    dimensions when its sampler is not "random".
+    """
+
+    sampler = "random"
+    dim = None
+
+    def estimate_many(self, n_replicates):
+        """
+        Returns an array of n_replicates independent estimates of pi, each
+        using sample_size samples, computed in one vectorized pass.
+
+        With a quasi-random sampler, every replicate uses an independently
+        scrambled sequence (randomized QMC), so the spread of the estimates
+        is still a valid measure of their error.
+        """
+        if self.sampler != "random":
+            from .qmc import rqmc_sums
+
+            sums = rqmc_sums(self, self.sampler, self.seed, n_replicates, self.sample_size, self.dim)
+        else:
+            sums = tiled_sums(self, make_rng(self.seed), n_replicates, self.sample_size)
+        return self._pi_from_hits(sums)
+
+    def estimate_until(self, target_se, max_samples):
+        """Returns the SequentialEstimate of sequential_estimate."""
+        self._check_independent("target_se")
+        return sequential_estimate(self, thread_rngs(self.seed, self.n_threads), target_se, max_samples)
+
+    def estimate_state(self, state, checkpoint = None, checkpoint_every = CHECKPOINT_SAMPLES):
+        """Draws samples into state with checkpoint.accumulate, and returns it."""
+        self._check_independent("estimate_state")
+        return accumulate(self, state, checkpoint, checkpoint_every)
+
+    def sweep(self, checkpoints):
+        """Returns the SequentialEstimate of each checkpoint from sweep_estimates."""
+        self._check_independent("sweep")
+        return sweep_estimates(self, make_rng(self.seed), checkpoints)
+
+    def _check_independent(self, feature):
+        """Raises a ValueError if feature needs independent scores, and they are not."""
+        if self.sampler != "random":
+            raise ValueError(f"{feature} is only avaliable with sampler=\"random\", as the scores of " +
+                             "quasi-random points are not independent.")
+
+    def _pi_from_hits(self, hits):
+        """The estimate of pi from the sum of the scores of sample_size samples."""
+        return self._pi_from_mean(hits / self.sample_size)
+
+    def _make_rng(self):
+        """Returns the generator of the points: a numpy Generator, or a quasi-random engine."""
+        if self.sampler == "random":
+            return make_rng(self.seed)
+        from .qmc import make_engine
+
+        return make_engine(self.sampler, self.seed, self.dim)
+
+    def _make_rngs(self):
+        """Returns the generators of the points of each thread."""
+        if self.sampler == "random":
+            return thread_rngs(self.seed, self.n_threads)
+        from .qmc import thread_engines
+
+        return thread_engines(self.sampler, self.seed, self.dim, split_sizes(self.sample_size, self.n_threads))
+
+
+class NeedleEstimator(SampledEstimator):
+    """
+    A SampledEstimator whose _draw and _score hooks dispatch on its needle
+    kernel, to _draw_angle and _score_angle or _draw_vector and _score_vector.
+    """
+
+    def _draw(self, rng, size):
+        if self.kernel == "vector":
+            return self._draw_vector(rng, size)
+        return self._draw_angle(rng, size)
+
+    def _score(self, *draws):
+        if self.kernel == "vector":
+            return self._score_vector(*draws)
+        return self._score_angle(*draws)
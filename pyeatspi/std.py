@@ -1,59 +1,232 @@
-from .methods.buffonsneedle import BuffonsNeedle
-from .methods.circleratio import CircleRatio
-from .methods.laplaceneedle import LaplaceNeedle
-from .methods.mcintegral import MCIntegral
-from .methods.drunkard import Drunkard
-from tqdm import tqdm
+from .estimate import load_method, qmc_methods
+from .profiling import ProgressEvent
 
-import numpy as np
+import os
 
-def compare_std(sample_size: int, simulation_size: int, methods: list = None):
+# The monte-carlo methods, whose variance can be compared
+all_methods = ["mc-integral", "circle-ratio", "drunkard", "buffon", "laplace"]
+
+def compare_std(sample_size: int, simulation_size: int, methods: list = None,
+                seed = None, n_jobs: int = 1, executor = None, batched: bool = True,
+                progress: bool = True, sampler: str = "random", callback = None, cache = None):
     """
     Compare the variance of the different methods of estimating pi.
 
+    The simulations are split into blocks, and every block gets its own
+    random stream spawned from a single root seed, so the results only
+    depend on the seed and not on how the blocks are spread across workers.
+
     Args:
         sample_size (int): The number of samples to use in the each estimation.
         simulation_size (int): The number of simulations to run for each method.
         methods (list): A list of the methods to compare. If None, all methods
         will be compared
+        seed (int): The root seed of the simulations. If None, fresh entropy
+        is drawn from the OS.
+        n_jobs (int): The number of worker processes to run the simulations
+        in. -1 uses all CPUs, and 1 runs them in the current process.
+        executor (concurrent.futures.Executor): An executor to submit the
+        simulations to instead of creating a process pool. Overrides n_jobs.
+        batched (bool): Whether to compute each block of simulations in one
+        vectorized pass with the estimator's estimate_many. If False, every
+        simulation creates its own estimator and calls estimate().
+        progress (bool): Whether to show a progress bar. tqdm is only imported
+        if it is shown.
+        sampler (str): The sampler of the methods which support quasi-random
+        points ('mc-integral' and 'circle-ratio'), one of 'random', 'sobol'
+        or 'halton'. Every simulation then uses an independently scrambled
+        sequence (randomized QMC), so their spread is still meaningful. The
+        other methods keep independent random points.
+        callback (callable): Called with a ProgressEvent for every warning,
+        every completed block of simulations (with the standard deviation of
+        the method so far) and the final result, instead of printing them.
+        An exception raised by the callback stops the remaining simulations.
+        cache (ResultCache): A cache to serve repeated calls with the same
+        seed from, or True for the default in-memory cache. The results do
+        not depend on n_jobs or executor, which are not part of the key.
 
     Returns:
         dict: A dictionary of the standard error of each method.
     """
 
-    all_methods = {"mc-integral": MCIntegral, 
-                   "circle-ratio": CircleRatio,
-                   "drunkard": Drunkard, 
-                   "buffon": BuffonsNeedle, 
-                   "laplace": LaplaceNeedle}
-    
+    import numpy as np
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from .qmc import check_sampler
+
+    check_sampler(sampler)
+
+    if cache:
+        from .cache import get_cache
+
+        computed = []
+
+        def run():
+            computed.append(True)
+            return compare_std(sample_size, simulation_size, methods, seed, n_jobs, executor,
+                               batched, progress, sampler, callback)
+
+        params = dict(sample_size=sample_size, simulation_size=simulation_size, methods=methods,
+                      seed=seed, batched=batched, sampler=sampler)
+        variances = get_cache(cache).call("compare_std", params, run)
+        if not computed:
+            # Report a cached result like a computed one
+            (callback or _ConsoleProgress(progress))(ProgressEvent("result", value=variances))
+        return variances
+
     # Filter methods if a selection is provided
     if methods:
-        methods_to_use = {name: all_methods[name] for name in methods if name in all_methods}
+        methods_to_use = {name: load_method(name) for name in methods if name in all_methods}
     else:
-        methods_to_use = all_methods
-        
-    if sample_size*simulation_size > 1000000:
-        print("WARNING: Large sample sizes or simulation sizes may take a long time to run.")
-    
-    variances = {}
-
-    length = len(methods_to_use) * simulation_size
-    print("Running simulations...")
-    bar = tqdm(total = length)
-
-    for method in methods_to_use:
-        estimates = np.zeros(simulation_size)
-        for i in range(simulation_size):
-            estimator = methods_to_use[method](sample_size=sample_size, viz=False)
-            pi = estimator.estimate()
-            estimates[i] = pi
-            bar.update(1)
-        variances[method] = np.std(estimates)
-
-    print("\nComparison of Standard Deviation for Pi Estimation Methods:")
-    print("=" * 59)
-    for method_name, variance in variances.items():
-        print(f"{method_name:<15}  {variance:.6f}")
-    
+        methods_to_use = {name: load_method(name) for name in all_methods}
+
+    if callback is None:
+        callback = _ConsoleProgress(progress)
+
+    if not batched and sample_size*simulation_size > 1000000:
+        callback(ProgressEvent("warning", message="Large sample sizes or simulation sizes may take " +
+                                                  "a long time to run."))
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    # Split the simulations in blocks, so that progress is reported regularly.
+    # Batched blocks are larger, as vectorizing across many replicates is
+    # what makes them fast.
+    block = max(1, simulation_size // (10 if batched else 100))
+    starts = range(0, simulation_size, block)
+
+    # One stream per block (or per simulation), spawned from the root seed
+    root = np.random.SeedSequence(seed)
+    tasks = []
+    for method, method_seed in zip(methods_to_use, root.spawn(len(methods_to_use))):
+        estimator = methods_to_use[method]
+        options = {"sampler": sampler} if sampler != "random" and method in qmc_methods else {}
+        if batched:
+            for start, block_seed in zip(starts, method_seed.spawn(len(starts))):
+                size = min(block, simulation_size - start)
+                tasks.append((method, start, _run_block, (estimator, sample_size, block_seed, size, options)))
+        else:
+            seeds = method_seed.spawn(simulation_size)
+            for start in starts:
+                tasks.append((method, start, _run_replicates,
+                              (estimator, sample_size, seeds[start:start + block], options)))
+
+    estimates = {method: np.zeros(simulation_size) for method in methods_to_use}
+    completed = {method: np.zeros(simulation_size, dtype=bool) for method in methods_to_use}
+
+    callback(ProgressEvent("start", done=0, total=len(methods_to_use) * simulation_size))
+
+    def record(method, start, block_estimates):
+        estimates[method][start:start + len(block_estimates)] = block_estimates
+        completed[method][start:start + len(block_estimates)] = True
+        callback(ProgressEvent("progress", method=method, done=int(np.count_nonzero(completed[method])),
+                               total=simulation_size, value=float(np.std(estimates[method][completed[method]]))))
+
+    if executor is None and n_jobs == 1:
+        for method, start, func, args in tasks:
+            record(method, start, func(*args))
+    else:
+        pool = executor if executor is not None else ProcessPoolExecutor(max_workers=n_jobs)
+        futures = {}
+        try:
+            futures = {pool.submit(func, *args): (method, start)
+                       for method, start, func, args in tasks}
+            for future in as_completed(futures):
+                record(*futures[future], future.result())
+        finally:
+            # Drop the simulations not yet started if the run was stopped
+            for future in futures:
+                future.cancel()
+            if executor is None:
+                pool.shutdown()
+
+    variances = {method: np.std(estimates[method]) for method in methods_to_use}
+    callback(ProgressEvent("result", value=variances))
+
     return variances
+
+
+class _ConsoleProgress:
+    """The default callback of compare_std, printing its progress and results."""
+
+    def __init__(self, progress):
+        self.progress = progress
+        self.bar = None
+        self.done = {}
+
+    def __call__(self, event):
+        if event.kind == "warning":
+            print("WARNING: " + event.message)
+        elif event.kind == "start":
+            print("Running simulations...")
+            if self.progress:
+                from tqdm import tqdm
+                self.bar = tqdm(total = event.total)
+        elif event.kind == "progress":
+            if self.bar is not None:
+                self.bar.update(event.done - self.done.get(event.method, 0))
+            self.done[event.method] = event.done
+        elif event.kind == "result":
+            if self.bar is not None:
+                self.bar.close()
+            print("\nComparison of Standard Deviation for Pi Estimation Methods:")
+            print("=" * 59)
+            for method_name, variance in event.value.items():
+                print(f"{method_name:<15}  {variance:.6f}")
+
+
+def _run_block(method, sample_size, seed, n_replicates, options):
+    """Runs n_replicates estimates of a method in one batch. Executed in the workers."""
+    return method(sample_size=sample_size, viz=False, seed=seed, **options).estimate_many(n_replicates)
+
+
+def _run_replicates(method, sample_size, seeds, options):
+    """Runs one estimate of a method for each seed. Executed in the workers."""
+    return [method(sample_size=sample_size, viz=False, seed=seed, **options).estimate() for seed in seeds]
+
+
+def compare_variance_reduction(sample_size: int, simulation_size: int, seed = None):
+    """
+    Compare the variance reduction strategies of the 'mc-integral' method.
+
+    Every strategy runs simulation_size estimates of sample_size samples.
+    The variance reduction factor (VRF) of a strategy is the variance of the
+    plain Monte Carlo estimates divided by its own variance, so it needs
+    about VRF times fewer samples for the same error. As antithetic pairs
+    evaluate the integrand twice per sample, the VRF per evaluation is also
+    reported, to compare the strategies at equal cost.
+
+    Args:
+        sample_size (int): The number of samples to use in the each estimation.
+        simulation_size (int): The number of simulations to run for each strategy.
+        seed (int): The root seed of the simulations.
+
+    Returns:
+        dict: The standard deviation, VRF and VRF per evaluation of each
+        strategy, with plain Monte Carlo as 'baseline'.
+    """
+
+    import numpy as np
+    from .methods.mcintegral import VARIANCE_REDUCTIONS
+
+    estimator = load_method("mc-integral")
+    root = np.random.SeedSequence(seed)
+    results = {}
+    for strategy, strategy_seed in zip(VARIANCE_REDUCTIONS, root.spawn(len(VARIANCE_REDUCTIONS))):
+        estimates = estimator(sample_size=sample_size, viz=False, seed=strategy_seed,
+                              variance_reduction=strategy).estimate_many(simulation_size)
+        results[strategy or "baseline"] = {"std": np.std(estimates)}
+
+    baseline = results["baseline"]["std"]**2
+    for strategy, result in results.items():
+        result["vrf"] = baseline / result["std"]**2
+        evaluations = 2 if strategy == "antithetic" else 1
+        result["vrf_per_evaluation"] = result["vrf"] / evaluations
+
+    print("\nVariance Reduction for Monte-Carlo Integration:")
+    print("=" * 59)
+    print(f"{'strategy':<15}  {'std':>10}  {'VRF':>10}  {'VRF/eval':>10}")
+    for strategy, result in results.items():
+        print(f"{strategy:<15}  {result['std']:10.6f}  {result['vrf']:10.1f}  {result['vrf_per_evaluation']:10.1f}")
+
+    return results
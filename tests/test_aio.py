@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+import pyeatspi
+
+
+def collect(*args, **kwargs):
+    async def run():
+        return [event async for event in pyeatspi.estimate_async(*args, **kwargs)]
+    return asyncio.run(run())
+
+
+def test_chunks_end_with_result():
+    events = collect(3000, "circle-ratio", seed=0, progress_every=1000)
+    assert [event.kind for event in events] == ["progress", "progress", "result"]
+    assert [event.done for event in events] == [1000, 2000, 3000]
+    assert all(event.se > 0 for event in events)
+
+
+def test_quasi_random_chunks_match_estimate():
+    events = collect(5000, "mc-integral", seed=0, sampler="sobol", n_threads=2, progress_every=1500)
+    expected = pyeatspi.estimate(5000, "mc-integral", seed=0, sampler="sobol", n_threads=2)
+    assert events[-1].value == pytest.approx(expected)
+    assert events[-1].se is None
+
+
+@pytest.mark.parametrize("n_chains", [None, 4])
+def test_drunkard_is_chunked(n_chains):
+    events = collect(3000, "drunkard", seed=0, burn_in=100, n_chains=n_chains, progress_every=1000)
+    assert [event.done for event in events] == [1100, 2100, 3000]
+    assert all(event.se is not None for event in events)
+    expected = pyeatspi.estimate(3000, "drunkard", seed=0, burn_in=100, n_chains=n_chains)
+    assert events[-1].value == pytest.approx(getattr(expected, "estimate", expected))
+
+
+@pytest.mark.parametrize("args, kwargs", [((0, "circle-ratio"), {}),
+                                          ((10, "chudnovsky"), {}),
+                                          ((10, "circle-ratio"), {"detailed": True}),
+                                          ((1000, "drunkard"), {"adaptive": True})])
+def test_rejects_unchunkable_runs(args, kwargs):
+    with pytest.raises(ValueError):
+        collect(*args, **kwargs)
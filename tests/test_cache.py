@@ -0,0 +1,93 @@
+import pytest
+
+import pyeatspi
+from pyeatspi.cache import ResultCache
+
+PARAMS = dict(sample_size=1000, method="drunkard", step_size=0.2, burn_in=10, seed=1)
+
+
+def test_key_covers_arguments():
+    cache = ResultCache()
+    key = cache.key("estimate", PARAMS)
+    assert cache.key("estimate", dict(PARAMS)) == key
+    assert cache.key("compare_std", PARAMS) != key
+    for name, value in [("method", "circle-ratio"), ("step_size", 0.3), ("burn_in", 20),
+                        ("seed", 2), ("sample_size", 1001)]:
+        assert cache.key("estimate", dict(PARAMS, **{name: value})) != key
+    assert cache.key("estimate", dict(PARAMS, tolerance=1e-6)) != key
+
+
+def test_key_covers_version(monkeypatch):
+    cache = ResultCache()
+    key = cache.key("estimate", PARAMS)
+    monkeypatch.setattr(pyeatspi, "__version__", "0.0.0")
+    assert cache.key("estimate", PARAMS) != key
+
+
+def test_memory_hit():
+    cache = ResultCache()
+    first = pyeatspi.estimate(1000, "circle-ratio", seed=3, cache=cache)
+    assert pyeatspi.estimate(1000, "circle-ratio", seed=3, cache=cache) == first
+    assert (cache.memory_hits, cache.misses) == (1, 1)
+
+
+def test_disk_hit_from_another_cache(tmp_path):
+    first = pyeatspi.estimate(1000, "circle-ratio", seed=3, cache=ResultCache(tmp_path))
+    cache = ResultCache(tmp_path)
+    assert pyeatspi.estimate(1000, "circle-ratio", seed=3, cache=cache) == first
+    assert (cache.disk_hits, cache.misses) == (1, 0)
+
+
+def test_unseeded_calls_bypass_cache():
+    cache = ResultCache()
+    pyeatspi.estimate(1000, "circle-ratio", cache=cache)
+    pyeatspi.estimate(1000, "circle-ratio", cache=cache)
+    assert (cache.hits, cache.misses, len(cache.memory)) == (0, 0, 0)
+    # The exact methods do not need a seed
+    pyeatspi.estimate(10, "chudnovsky", cache=cache)
+    pyeatspi.estimate(10, "chudnovsky", cache=cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_detailed_bypasses_cache():
+    cache = ResultCache()
+    result = pyeatspi.estimate(1000, "circle-ratio", seed=3, detailed=True, cache=cache)
+    pyeatspi.estimate(1000, "circle-ratio", seed=3, detailed=True, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 0)
+    assert result.estimate == pyeatspi.estimate(1000, "circle-ratio", seed=3)
+
+
+def test_disk_eviction(tmp_path):
+    import os
+    import time
+
+    cache = ResultCache(tmp_path)
+    # Last used in the order entry1, entry2, entry0
+    for i, age in enumerate([10, 30, 20]):
+        cache.put(f"entry{i}", bytes(1000))
+        os.utime(cache._file(f"entry{i}"), (time.time() - age, time.time() - age))
+    cache.max_bytes = 2 * os.path.getsize(cache._file("entry0"))
+    cache.put("entry3", bytes(1000))
+    # The least recently used entries are evicted first
+    remaining = sorted(name[:-4] for name in os.listdir(tmp_path) if name.endswith(".pkl"))
+    assert remaining == ["entry0", "entry3"]
+    assert cache.stats()["disk_bytes"] <= cache.max_bytes
+
+
+def test_all_threads_share_a_key(monkeypatch):
+    import os
+
+    cache = ResultCache()
+    monkeypatch.setattr(os, "cpu_count", lambda: 3)
+    first = pyeatspi.estimate(1000, "circle-ratio", seed=3, n_threads=-1, cache=cache)
+    assert pyeatspi.estimate(1000, "circle-ratio", seed=3, n_threads=3, cache=cache) == first
+    assert (cache.memory_hits, cache.misses) == (1, 1)
+
+
+def test_store_keyed_by_path(tmp_path):
+    from pyeatspi.digitstore import DigitStore
+
+    cache = ResultCache()
+    key = cache.key("estimate", dict(PARAMS, store=DigitStore(tmp_path / "a")))
+    assert cache.key("estimate", dict(PARAMS, store=DigitStore(tmp_path / "a"))) == key
+    assert cache.key("estimate", dict(PARAMS, store=DigitStore(tmp_path / "b"))) != key
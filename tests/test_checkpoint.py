@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+import pyeatspi
+from pyeatspi.checkpoint import EstimateState
+
+
+class Killed(Exception):
+    pass
+
+
+def kill_after_saves(monkeypatch, n_saves):
+    """Makes EstimateState.save raise Killed once it has saved n_saves times."""
+    save = EstimateState.save
+    saves = []
+
+    def save_then_kill(self, path):
+        save(self, path)
+        saves.append(path)
+        if len(saves) == n_saves:
+            raise Killed()
+
+    monkeypatch.setattr(EstimateState, "save", save_then_kill)
+
+
+@pytest.mark.parametrize("method, options", [("circle-ratio", {}),
+                                             ("mc-integral", {"variance_reduction": "antithetic"}),
+                                             ("buffon", {"kernel": "vector"}),
+                                             ("laplace", {})])
+def test_resume_matches_uninterrupted_run(tmp_path, monkeypatch, method, options):
+    full = pyeatspi.estimate_state(10000, method, seed=7, checkpoint_every=1500, **options)
+
+    checkpoint = tmp_path / "run.json"
+    with monkeypatch.context() as patch:
+        kill_after_saves(patch, 3)
+        with pytest.raises(Killed):
+            pyeatspi.estimate_state(10000, method, seed=7, checkpoint=checkpoint, checkpoint_every=1500,
+                                    **options)
+    assert EstimateState.load(checkpoint).samples == 4500
+    resumed = pyeatspi.estimate_state(10000, method, seed=7, checkpoint=checkpoint, checkpoint_every=1500,
+                                      **options)
+
+    assert resumed.samples == full.samples == 10000
+    assert (resumed.stats.mean, resumed.stats.m2) == (full.stats.mean, full.stats.m2)
+    assert resumed.result() == full.result()
+
+
+def test_resume_rejects_other_options(tmp_path):
+    checkpoint = tmp_path / "run.json"
+    pyeatspi.estimate_state(1000, "mc-integral", seed=0, checkpoint=checkpoint)
+    with pytest.raises(ValueError):
+        pyeatspi.estimate_state(2000, "mc-integral", seed=0, checkpoint=checkpoint,
+                                variance_reduction="control")
+
+
+def shard(scores):
+    state = EstimateState("circle-ratio")
+    state.stats.update(np.asarray(scores, dtype=float))
+    return state
+
+
+def test_merge_is_associative_and_commutative():
+    rng = np.random.default_rng(0)
+    a, b, c = (shard(rng.random(n) < 0.8) for n in (100, 2000, 37))
+    merged = [pyeatspi.merge_states([a, b, c]), a.merge(b.merge(c)), pyeatspi.merge_states([c, a, b])]
+    for state in merged[1:]:
+        assert state.samples == merged[0].samples
+        assert state.stats.mean == pytest.approx(merged[0].stats.mean, rel=1e-12)
+        assert state.stats.m2 == pytest.approx(merged[0].stats.m2, rel=1e-12)
+
+
+def test_merged_standard_error():
+    rng = np.random.default_rng(1)
+    scores = [rng.random(n) < np.pi / 4 for n in (500, 1234, 10000)]
+    result = pyeatspi.merge_states(shard(s) for s in scores).result()
+    pooled = np.concatenate(scores).astype(float)
+    assert result.samples == pooled.size
+    assert result.estimate == pytest.approx(4 * pooled.mean())
+    assert result.se == pytest.approx(4 * pooled.std(ddof=1) / np.sqrt(pooled.size))
+
+
+def test_merged_state_cannot_resume():
+    merged = pyeatspi.estimate_state(1000, "circle-ratio", seed=(0, 0)).merge(
+        pyeatspi.estimate_state(1000, "circle-ratio", seed=(0, 1)))
+    assert merged.samples == 2000
+    with pytest.raises(ValueError):
+        pyeatspi.estimate_state(3000, "circle-ratio", seed=0, state=merged)
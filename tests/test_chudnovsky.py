@@ -0,0 +1,105 @@
+import decimal
+import io
+
+import pytest
+
+from pyeatspi.methods.chudnovsky import Chudnovsky
+
+PI_50 = "3.14159265358979323846264338327950288419716939937510"
+
+
+def machin_digits(digits):
+    """Returns "31415..." to digits decimal places, from Machin's formula in integers."""
+    guard = 10
+    scale = 10**(digits + guard)
+
+    def arctan_inverse(x):
+        total = term = scale // x
+        n, sign = 1, 1
+        while term:
+            term //= x * x
+            n += 2
+            sign = -sign
+            total += sign * (term // n)
+        return total
+
+    pi = 16 * arctan_inverse(5) - 4 * arctan_inverse(239)
+    return str(pi // 10**guard)
+
+
+REFERENCE = machin_digits(4000)
+
+
+def test_known_prefix():
+    assert str(Chudnovsky(50, False).estimate()) == PI_50
+
+
+@pytest.mark.parametrize("digits", [0, 1, 13, 14, 15, 28, 100, 1000, 4000])
+def test_estimate_matches_reference(digits):
+    pi = Chudnovsky(digits, False).estimate()
+    assert isinstance(pi, decimal.Decimal)
+    assert str(pi).replace(".", "") == REFERENCE[:digits + 1]
+
+
+def test_series_resumes():
+    # A larger request extends the series summed for a smaller one
+    estimator = Chudnovsky(100, False)
+    estimator.estimate()
+    estimator.sample_size = 3000
+    assert str(estimator.estimate()).replace(".", "") == REFERENCE[:3001]
+
+
+def test_parallel_split_matches_binary_split():
+    estimator = Chudnovsky(0, False, n_jobs=2)
+    assert estimator.parallel_split(3, 200) == estimator.binary_split(3, 200)
+
+
+def test_store_extends(tmp_path):
+    assert str(Chudnovsky(500, False, store=tmp_path).estimate()).replace(".", "") == REFERENCE[:501]
+    assert str(Chudnovsky(2000, False, store=tmp_path).estimate()).replace(".", "") == REFERENCE[:2001]
+    assert str(Chudnovsky(300, False, store=tmp_path).estimate()).replace(".", "") == REFERENCE[:301]
+
+
+@pytest.mark.parametrize("chunk_digits", [1, 7, 1000, 65536])
+def test_write(chunk_digits):
+    output = io.StringIO()
+    assert Chudnovsky(3000, False).write(output, chunk_digits) == 3000
+    assert output.getvalue() == "3." + REFERENCE[1:3001]
+
+
+def test_write_path(tmp_path):
+    path = tmp_path / "pi.txt"
+    Chudnovsky(2000, False, output=path).estimate()
+    assert path.read_text() == "3." + REFERENCE[1:2001]
+
+
+def test_write_from_store(tmp_path):
+    output = io.StringIO()
+    Chudnovsky(2000, False, store=tmp_path).write(output, chunk_digits=300)
+    assert output.getvalue() == "3." + REFERENCE[1:2001]
+
+
+@pytest.mark.parametrize("store", [False, True])
+def test_digits(tmp_path, store):
+    estimator = Chudnovsky(0, False, store=tmp_path if store else None)
+    assert estimator.digits(0, 1) == "3"
+    assert estimator.digits(1, 10) == REFERENCE[1:11]
+    assert estimator.digits(3000, 1001) == REFERENCE[3000:4001]
+    # Slices of the digits already computed
+    assert estimator.digits(1234, 56) == REFERENCE[1234:1290]
+    assert estimator.digits(10, 0) == ""
+
+
+def test_digits_rejects_negative():
+    with pytest.raises(ValueError):
+        Chudnovsky(0, False).digits(-1, 5)
+
+
+@pytest.mark.parametrize("n_jobs", [0, -2])
+def test_rejects_invalid_n_jobs(n_jobs):
+    with pytest.raises(ValueError, match="n_jobs must be a positive integer"):
+        Chudnovsky(10, False, n_jobs=n_jobs)
+
+
+def test_all_cpus():
+    assert Chudnovsky(10, False, n_jobs=-1).n_jobs >= 1
@@ -0,0 +1,110 @@
+import math
+
+import numpy as np
+import pytest
+
+import pyeatspi
+from pyeatspi.methods.drunkard import FIRST_STAGE, Drunkard
+from pyeatspi.sampling import AdaptiveChainEstimate, split_rhat
+
+
+TARGETS = [0.3, 0.6, 0.8]
+
+
+@pytest.fixture(scope="module")
+def tuned():
+    return {target: pyeatspi.estimate(40000, "drunkard", seed=0, adaptive=True, n_chains=4,
+                                      target_acceptance=target)
+            for target in TARGETS}
+
+
+@pytest.mark.parametrize("target", TARGETS)
+def test_adaptive_tunes_to_target_acceptance(tuned, target):
+    assert isinstance(tuned[target], AdaptiveChainEstimate)
+    assert tuned[target].acceptance_rate == pytest.approx(target, abs=0.05)
+
+
+def test_adaptive_step_size_decreases_with_target(tuned):
+    steps = [tuned[target].step_size for target in TARGETS]
+    assert steps[0] > steps[1] > steps[2]
+
+
+def test_adaptive_result():
+    result = pyeatspi.estimate(40000, "drunkard", seed=1, adaptive=True, n_chains=4)
+    assert abs(result.estimate - math.pi) < 4 * result.se
+    assert result.samples == 4 * (40000 - result.burn_in)
+    assert result.iat == pytest.approx(result.samples / result.ess)
+    assert result.ess_per_sec > 0
+    # The burn in ends at the end of a stage of doubling length
+    stages = np.cumsum([FIRST_STAGE * 2**k for k in range(10)])
+    assert result.burn_in in stages
+
+
+def test_adaptive_burn_in_is_a_minimum():
+    result = pyeatspi.estimate(30000, "drunkard", seed=1, adaptive=True, burn_in=10000)
+    assert result.burn_in >= 10000
+
+
+def test_adaptive_burn_in_over_cap_raises():
+    with pytest.raises(ValueError, match="burn_in"):
+        pyeatspi.estimate(1000, "drunkard", seed=0, adaptive=True, burn_in=501)
+
+
+def test_adaptive_warns_without_convergence(capsys):
+    # A tiny step size cannot mix the chains from the corners in time
+    pyeatspi.estimate(4000, "drunkard", seed=0, adaptive=True, n_chains=4, step_size=1e-4,
+                      target_acceptance=0.999)
+    assert "did not converge" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("call", [lambda d: d.estimate_many(2), lambda d: d.sweep([10])])
+def test_adaptive_rejected_elsewhere(call):
+    with pytest.raises(ValueError, match="adaptive"):
+        call(Drunkard(1000, False, seed=0, adaptive=True))
+
+
+def test_split_rhat():
+    rng = np.random.default_rng(0)
+    # Two halves of 4 chains of 2 statistics drawn from the same distribution
+    values = rng.normal(size=(2, 500, 2, 4))
+    mixed = split_rhat(values.sum(axis=1), (values**2).sum(axis=1), (500, 500))
+    assert mixed < 1.01
+    # Chains stuck around different values
+    values[:, :, 0, :] += np.arange(4) * 3
+    stuck = split_rhat(values.sum(axis=1), (values**2).sum(axis=1), (500, 500))
+    assert stuck > 1.5
+
+
+def test_chains_within_standard_error():
+    result = pyeatspi.estimate(5000, "drunkard", seed=0, burn_in=500, n_chains=64)
+    assert result.samples == 64 * 4500
+    assert abs(result.estimate - math.pi) < 4 * result.se
+    # The steps of a chain are positively correlated
+    assert 0 < result.ess < result.samples
+
+
+def test_chains_standard_error_is_calibrated():
+    results = [pyeatspi.estimate(2000, "drunkard", seed=seed, burn_in=200, n_chains=32) for seed in range(20)]
+    spread = np.std([result.estimate for result in results], ddof=1)
+    se = np.mean([result.se for result in results])
+    assert 0.6 < spread / se < 1.6
+
+
+def test_one_chain_agrees_with_scalar_walk():
+    chain = pyeatspi.estimate(40000, "drunkard", seed=1, burn_in=1000, n_chains=1)
+    walk = pyeatspi.estimate(40000, "drunkard", seed=1, burn_in=1000)
+    assert chain.samples == 39000
+    assert abs(chain.estimate - walk) < 4 * math.sqrt(2) * chain.se
+
+
+def test_one_chain_sweep_matches_scalar_walk():
+    # A single walk of sweep draws the same steps as estimate
+    walk = pyeatspi.estimate(3000, "drunkard", seed=2, burn_in=100)
+    [result] = pyeatspi.sweep([2900], "drunkard", seed=2, burn_in=100)
+    assert result.estimate == pytest.approx(walk)
+
+
+def test_estimate_many_replicates_are_chains():
+    estimates = Drunkard(2000, False, burn_in=200, seed=3).estimate_many(16)
+    assert estimates.shape == (16,)
+    assert len(set(estimates)) > 1
@@ -0,0 +1,59 @@
+import math
+
+import numpy as np
+import pytest
+
+from pyeatspi.methods.newtons import Newtons
+from tests.test_chudnovsky import REFERENCE
+
+
+def test_starts_roots_and_basins():
+    starts = np.array([[3.0, 6.0], [9.5, -3.0]])
+    result = Newtons(50, False, starts=starts, tolerance=1e-12).estimate()
+    assert result.roots.shape == starts.shape
+    np.testing.assert_allclose(result.roots, [[math.pi, 2 * math.pi], [3 * math.pi, -math.pi]], atol=1e-12)
+    np.testing.assert_array_equal(result.basins, [[1, 2], [3, -1]])
+    assert np.all(result.iterations > 0)
+
+
+def test_starts_that_do_not_converge_are_nan():
+    # cos(pi/2) = 0, so the first step is infinite, and 2 iterations are too few from 1.2
+    result = Newtons(2, False, starts=[math.pi / 2, 1.2, 3.1], tolerance=1e-12).estimate()
+    assert np.isnan(result.roots[0]) and np.isnan(result.basins[0])
+    assert np.isnan(result.roots[1]) and np.isnan(result.basins[1])
+    assert result.roots[2] == pytest.approx(math.pi, abs=1e-12)
+
+
+def test_halley_agrees_with_newton_in_fewer_iterations():
+    starts = np.linspace(2.2, 4.0, 10)
+    newton = Newtons(50, False, starts=starts, tolerance=1e-13).estimate()
+    halley = Newtons(50, False, starts=starts, tolerance=1e-13, halley=True).estimate()
+    np.testing.assert_allclose(halley.roots, math.pi, atol=1e-13)
+    np.testing.assert_allclose(newton.roots, math.pi, atol=1e-13)
+    assert halley.iterations.sum() < newton.iterations.sum()
+
+
+def test_precision_matches_reference():
+    pi = Newtons(100, False, precision=1000).estimate()
+    assert str(pi).replace(".", "") == REFERENCE[:1001]
+
+
+def test_precision_starts_from_inital_guess():
+    import decimal
+
+    two_pi = Newtons(100, False, precision=100, inital_guess=6.0).estimate()
+    with decimal.localcontext() as ctx:
+        ctx.prec = 200
+        assert str(two_pi / 2)[:90] == "3." + REFERENCE[1:89]
+    with pytest.raises(ValueError):
+        Newtons(100, False, precision=100, inital_guess=1.0).estimate()
+
+
+def test_precision_needs_enough_iterations():
+    with pytest.raises(ValueError, match="iterations are needed"):
+        Newtons(3, False, precision=10000, inital_guess=3.0).estimate()
+
+
+def test_starts_and_precision_cannot_be_combined():
+    with pytest.raises(ValueError):
+        Newtons(10, False, starts=[3.0], precision=20).estimate()
@@ -0,0 +1,52 @@
+import math
+
+import numpy as np
+import pytest
+
+import pyeatspi
+from pyeatspi.estimate import load_method
+from pyeatspi.sampling import CHUNK_SIZE, RunningStats, chunk_sizes, chunked_sum, make_rng
+
+METHODS = ["mc-integral", "circle-ratio", "buffon", "laplace"]
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_numpy_matches_python_statistically(method):
+    results = {backend: pyeatspi.estimate(40000, method, seed=0, backend=backend, detailed=True)
+               for backend in ("python", "numpy")}
+    python, numpy = results["python"], results["numpy"]
+    assert abs(numpy.estimate - math.pi) < 4 * numpy.se
+    assert abs(python.estimate - math.pi) < 4 * python.se
+    # The standard errors of both backends measure the same variance
+    assert numpy.se == pytest.approx(python.se, rel=0.1)
+
+
+def test_chunk_sizes():
+    assert list(chunk_sizes(2501, 1000)) == [1000, 1000, 501]
+    assert list(chunk_sizes(2000, 1000)) == [1000, 1000]
+    assert list(chunk_sizes(0, 1000)) == []
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_chunked_sum_counts_every_sample(method):
+    estimator = load_method(method)(sample_size=2501, viz=False)
+    stats = RunningStats()
+    total = chunked_sum(estimator, make_rng(0), 2501, chunk_size=1000, stats=stats)
+    assert stats.count == 2501
+    assert total == pytest.approx(stats.mean * 2501)
+
+
+@pytest.mark.parametrize("sample_size", [CHUNK_SIZE - 1, CHUNK_SIZE + 7])
+def test_sample_size_across_chunk_boundary(sample_size):
+    estimator = load_method("mc-integral")(sample_size=sample_size, viz=False, backend="numpy", seed=0)
+    estimator.collect_stats = True
+    estimate = estimator.estimate()
+    assert estimator.stats.count == sample_size
+    assert estimate == pytest.approx(4 * estimator.stats.mean)
+    assert abs(estimate - math.pi) < 4 * 4 * math.sqrt(estimator.stats.variance / sample_size)
+
+
+def test_estimate_many_shape_across_tiles():
+    estimates = load_method("circle-ratio")(sample_size=CHUNK_SIZE // 3 + 1, viz=False, seed=0).estimate_many(5)
+    assert estimates.shape == (5,)
+    assert np.all(np.abs(estimates - math.pi) < 0.02)
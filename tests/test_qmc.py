@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from pyeatspi.qmc import Halton, Sobol, make_engine, thread_engines
+from pyeatspi.sampling import split_sizes
+
+# The first points of the unscrambled 2-D Sobol sequence (in Gray code order,
+# as generated by the Joe-Kuo direction numbers)
+SOBOL_2D = [[0, 0], [0.5, 0.5], [0.75, 0.25], [0.25, 0.75],
+            [0.375, 0.375], [0.875, 0.875], [0.625, 0.125], [0.125, 0.625]]
+
+# Radical inverses of 0..5 in bases 2 and 3
+HALTON_2D = [[0, 0], [1 / 2, 1 / 3], [1 / 4, 2 / 3], [3 / 4, 1 / 9], [1 / 8, 4 / 9], [5 / 8, 7 / 9]]
+
+
+def test_unscrambled_sobol():
+    np.testing.assert_array_equal(Sobol(2, scramble=False).random(8).T, SOBOL_2D)
+
+
+def test_unscrambled_halton():
+    np.testing.assert_allclose(Halton(2, scramble=False).random(6).T, HALTON_2D, atol=1e-15)
+
+
+def box_counts(points, splits, bases):
+    """Counts the points in each box of widths base**-split along each axis."""
+    cells = [np.floor(p * base**k).astype(int) for p, base, k in zip(points, bases, splits)]
+    widths = [base**k for base, k in zip(bases, splits)]
+    return np.bincount(np.ravel_multi_index(cells, widths), minlength=int(np.prod(widths)))
+
+
+@pytest.mark.parametrize("scramble", [False, True])
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_sobol_is_a_balanced_net(scramble, seed):
+    m = 8
+    points = Sobol(2, seed=seed, scramble=scramble).random(2**m)
+    assert points.min() >= 0 and points.max() < 1
+    # Every dyadic box of volume 2**-m holds exactly one point, a (0, m, 2)-net
+    for k in range(m + 1):
+        assert np.all(box_counts(points, (k, m - k), (2, 2)) == 1)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_scrambled_halton_is_balanced(seed):
+    engine = Halton(2, seed=seed)
+    points = engine.random(2**8 * 3**5)
+    assert points.min() >= 0 and points.max() < 1
+    # Each coordinate is stratified in its own base
+    assert np.all(box_counts(points[:1], (8,), (2,)) == 3**5)
+    assert np.all(box_counts(points[1:], (5,), (3,)) == 2**8)
+
+
+@pytest.mark.parametrize("sampler", ["sobol", "halton"])
+def test_scrambles_differ_between_seeds(sampler):
+    assert not np.array_equal(make_engine(sampler, 0, 2).random(16), make_engine(sampler, 1, 2).random(16))
+
+
+@pytest.mark.parametrize("sampler", ["sobol", "halton"])
+@pytest.mark.parametrize("n_threads", [2, 3, 7])
+def test_thread_offsets_reproduce_single_stream(sampler, n_threads):
+    total = 1001
+    single = make_engine(sampler, 5, 2).random(total)
+    engines = thread_engines(sampler, 5, 2, split_sizes(total, n_threads))
+    parts = [engine.random(n) for engine, n in zip(engines, split_sizes(total, n_threads))]
+    # The Halton digits are summed in another order past the largest index of a thread
+    np.testing.assert_allclose(np.concatenate(parts, axis=1), single, rtol=0, atol=1e-15)
+
+
+def test_engine_continues_where_it_stopped():
+    engine = make_engine("sobol", 3, 2)
+    first, second = engine.random(100), engine.random(156)
+    np.testing.assert_array_equal(np.concatenate([first, second], axis=1), make_engine("sobol", 3, 2).random(256))
@@ -0,0 +1,15 @@
+import pytest
+
+from pyeatspi.methods.buffonsneedle import BuffonsNeedle
+from pyeatspi.methods.circleratio import CircleRatio
+
+
+@pytest.mark.parametrize("estimator", [
+    BuffonsNeedle(1000, "raster", kernel="vector"),
+    BuffonsNeedle(1000, "raster", kernel="vector", dtype="float32"),
+    BuffonsNeedle(1000, "raster", n_threads=2),
+    CircleRatio(1000, "raster", n_threads=2),
+])
+def test_raster_rejects_options_it_cannot_honor(estimator):
+    with pytest.raises(ValueError, match="raster"):
+        estimator.estimate()
@@ -0,0 +1,53 @@
+import math
+
+import numpy as np
+import pytest
+
+import pyeatspi
+from pyeatspi.estimate import DEFAULT_MAX_SAMPLES
+
+METHODS = ["mc-integral", "circle-ratio", "buffon", "laplace"]
+
+
+@pytest.mark.parametrize("method", METHODS)
+@pytest.mark.parametrize("n_threads", [1, 2])
+def test_stops_at_target_se(method, n_threads):
+    result = pyeatspi.estimate(None, method, seed=0, target_se=0.005, n_threads=n_threads)
+    assert result.se <= 0.005
+    assert abs(result.estimate - math.pi) < 5 * result.se
+    # It stops soon after reaching the target, not at the budget
+    assert result.samples < DEFAULT_MAX_SAMPLES
+
+
+@pytest.mark.parametrize("method", METHODS)
+def test_respects_budget(method):
+    result = pyeatspi.estimate(None, method, seed=0, target_se=1e-6, max_samples=54321)
+    assert result.samples == 54321
+    assert result.se > 1e-6
+
+
+def test_sample_size_is_the_default_budget():
+    assert pyeatspi.estimate(12345, "circle-ratio", seed=0, target_se=1e-6).samples == 12345
+
+
+@pytest.mark.parametrize("method", ["buffon", "laplace"])
+def test_needle_delta_method_se_is_calibrated(method):
+    # A target of 0 spends the whole budget, so every run has the same size
+    results = [pyeatspi.estimate(None, method, seed=seed, target_se=0, max_samples=20000)
+               for seed in range(30)]
+    spread = np.std([result.estimate for result in results], ddof=1)
+    se = np.mean([result.se for result in results])
+    assert 0.7 < spread / se < 1.4
+
+
+@pytest.mark.parametrize("kwargs", [{"sampler": "sobol"}, {"sampler": "halton"},
+                                    {"variance_reduction": "stratified"}])
+def test_rejects_dependent_scores(kwargs):
+    method = "mc-integral" if "variance_reduction" in kwargs else "circle-ratio"
+    with pytest.raises(ValueError):
+        pyeatspi.estimate(None, method, seed=0, target_se=0.01, **kwargs)
+
+
+def test_rejects_other_methods():
+    with pytest.raises(ValueError):
+        pyeatspi.estimate(None, "drunkard", seed=0, target_se=0.01)
@@ -0,0 +1,26 @@
+import pytest
+
+import pyeatspi
+
+METHODS = ["mc-integral", "circle-ratio", "drunkard", "buffon", "laplace"]
+
+
+@pytest.mark.parametrize("batched", [True, False])
+def test_result_does_not_depend_on_n_jobs(batched):
+    results = [pyeatspi.compare_std(200, 40, METHODS, seed=11, n_jobs=n_jobs, batched=batched, progress=False)
+               for n_jobs in (1, 2, 3)]
+    assert results[1] == results[0]
+    assert results[2] == results[0]
+
+
+def test_result_does_not_depend_on_executor():
+    from concurrent.futures import ThreadPoolExecutor
+
+    expected = pyeatspi.compare_std(200, 40, METHODS, seed=11, progress=False)
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        assert pyeatspi.compare_std(200, 40, METHODS, seed=11, executor=executor, progress=False) == expected
+
+
+def test_seeds_give_different_results():
+    assert (pyeatspi.compare_std(200, 40, ["circle-ratio"], seed=1, progress=False)
+            != pyeatspi.compare_std(200, 40, ["circle-ratio"], seed=2, progress=False))
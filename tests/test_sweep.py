@@ -0,0 +1,32 @@
+import pytest
+
+import pyeatspi
+from pyeatspi.checkpoint import EstimateState
+
+
+@pytest.mark.parametrize("method", ["buffon", "laplace"])
+def test_no_crossings_raises_value_error(method):
+    # A single needle crosses no line for most seeds
+    for seed in range(20):
+        try:
+            pyeatspi.sweep([1, 2], method, seed=seed)
+        except ValueError as error:
+            assert "No needles crossed a line" in str(error)
+            return
+    pytest.fail("Every seed crossed a line.")
+
+
+def test_state_without_crossings_raises_value_error():
+    state = EstimateState("buffon")
+    state.stats.count = 10
+    with pytest.raises(ValueError, match="No needles crossed a line"):
+        state.result()
+
+
+def test_sweep_matches_state():
+    # One checkpoint draws the same chunks as a state of that size
+    [sweep] = pyeatspi.sweep([20000], "circle-ratio", seed=3)
+    result = pyeatspi.estimate_state(20000, "circle-ratio", seed=3).result()
+    assert sweep.samples == result.samples
+    assert sweep.estimate == pytest.approx(result.estimate)
+    assert sweep.se == pytest.approx(result.se)
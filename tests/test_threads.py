@@ -0,0 +1,33 @@
+import pytest
+
+import pyeatspi
+
+CASES = [("mc-integral", {}), ("mc-integral", {"variance_reduction": "control"}),
+         ("mc-integral", {"sampler": "halton"}), ("circle-ratio", {}),
+         ("circle-ratio", {"sampler": "sobol"}), ("buffon", {}), ("laplace", {"kernel": "vector"})]
+
+
+@pytest.mark.parametrize("method, options", CASES)
+@pytest.mark.parametrize("n_threads", [2, 3])
+def test_same_seed_and_threads_give_same_estimate(method, options, n_threads):
+    estimates = {pyeatspi.estimate(30001, method, seed=5, n_threads=n_threads, **options) for _ in range(3)}
+    assert len(estimates) == 1
+
+
+@pytest.mark.parametrize("method, options", CASES)
+def test_one_thread_matches_numpy_backend(method, options):
+    assert (pyeatspi.estimate(30001, method, seed=5, n_threads=1, backend="numpy", **options)
+            == pyeatspi.estimate(30001, method, seed=5, backend="numpy", **options))
+
+
+@pytest.mark.parametrize("sampler", ["sobol", "halton"])
+def test_quasi_random_threads_draw_the_same_points(sampler):
+    # The threads split one sequence, so only the order of the sums changes
+    single = pyeatspi.estimate(30001, "circle-ratio", seed=5, sampler=sampler)
+    assert pyeatspi.estimate(30001, "circle-ratio", seed=5, sampler=sampler, n_threads=4) == \
+        pytest.approx(single, abs=1e-12)
+
+
+def test_target_se_is_deterministic_with_threads():
+    first = pyeatspi.estimate(None, "circle-ratio", seed=5, target_se=0.005, n_threads=3)
+    assert pyeatspi.estimate(None, "circle-ratio", seed=5, target_se=0.005, n_threads=3) == first
@@ -0,0 +1,42 @@
+import math
+
+import numpy as np
+import pytest
+
+import pyeatspi
+from pyeatspi.methods.mcintegral import MCIntegral
+
+STRATEGIES = ["stratified", "antithetic", "control", "importance"]
+
+
+def replicates(variance_reduction, seed, sample_size=1000, n_replicates=400):
+    estimator = MCIntegral(sample_size, False, seed=seed, variance_reduction=variance_reduction)
+    return estimator.estimate_many(n_replicates)
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_strategy_is_unbiased(strategy):
+    estimates = replicates(strategy, seed=0)
+    se = estimates.std(ddof=1) / math.sqrt(estimates.size)
+    assert abs(estimates.mean() - math.pi) < 4 * se
+
+
+@pytest.mark.parametrize("strategy", STRATEGIES)
+def test_strategy_lowers_variance(strategy):
+    assert replicates(strategy, seed=1).var() < replicates(None, seed=2).var() / 1.5
+
+
+@pytest.mark.parametrize("strategy", ["antithetic", "control", "importance"])
+def test_scalar_estimate_is_unbiased(strategy):
+    # The single estimate, through the chunked path, with its standard error
+    result = pyeatspi.estimate(100000, "mc-integral", seed=3, variance_reduction=strategy, detailed=True)
+    assert abs(result.estimate - math.pi) < 4 * result.se
+
+
+def test_compare_variance_reduction():
+    results = pyeatspi.compare_variance_reduction(1000, 200, seed=0)
+    assert set(results) == {"baseline", *STRATEGIES}
+    assert results["baseline"]["vrf"] == 1
+    for strategy in STRATEGIES:
+        assert results[strategy]["vrf"] > 1.5
+    assert results["antithetic"]["vrf_per_evaluation"] == pytest.approx(results["antithetic"]["vrf"] / 2)